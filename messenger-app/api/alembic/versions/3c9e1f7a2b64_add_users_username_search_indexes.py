@@ -0,0 +1,33 @@
+"""add users username search indexes
+
+Revision ID: 3c9e1f7a2b64
+Revises: 0b42f9d50e8f
+Create Date: 2026-10-17 00:00:00.000000
+"""
+
+from collections.abc import Sequence
+
+from alembic import op  # type: ignore
+
+# revision identifiers, used by Alembic.
+revision: str = "3c9e1f7a2b64"
+down_revision: str | Sequence[str] | None = "0b42f9d50e8f"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # Substring matches (ILIKE '%q%') for queries of 3+ characters.
+    op.execute("CREATE INDEX ix_users_username_trgm ON users USING gin (username gin_trgm_ops)")
+    # Prefix matches (lower(username) LIKE 'q%') for short queries.
+    op.execute(
+        "CREATE INDEX ix_users_username_lower_prefix ON users (lower(username) text_pattern_ops)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_users_username_lower_prefix", table_name="users")
+    op.drop_index("ix_users_username_trgm", table_name="users")
@@ -0,0 +1,80 @@
+"""add conversations last message
+
+Revision ID: 7d2a4c8e9f13
+Revises: 3c9e1f7a2b64
+Create Date: 2026-10-17 00:00:00.000000
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+from alembic import op  # type: ignore
+
+# revision identifiers, used by Alembic.
+revision: str = "7d2a4c8e9f13"
+down_revision: str | Sequence[str] | None = "3c9e1f7a2b64"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("conversations", sa.Column("last_message_id", UUID(as_uuid=True), nullable=True))
+    op.add_column(
+        "conversations",
+        sa.Column(
+            "last_message_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+    )
+    op.create_foreign_key(
+        "fk_conversations_last_message_id",
+        "conversations",
+        "messages",
+        ["last_message_id"],
+        ["id"],
+        ondelete="SET NULL",
+    )
+
+    op.execute(
+        """
+        UPDATE conversations c
+        SET last_message_at = GREATEST(
+            c.created_at,
+            (SELECT max(m.created_at) FROM messages m WHERE m.conversation_id = c.id)
+        ),
+        last_message_id = (
+            SELECT m.id FROM messages m
+            WHERE m.conversation_id = c.id AND m.deleted_at IS NULL
+            ORDER BY m.created_at DESC, m.id DESC
+            LIMIT 1
+        )
+    """
+    )
+
+    op.execute(
+        "CREATE INDEX ix_conversations_user_a_activity "
+        "ON conversations (user_a_id, last_message_at DESC, id DESC)"
+    )
+    op.execute(
+        "CREATE INDEX ix_conversations_user_b_activity "
+        "ON conversations (user_b_id, last_message_at DESC, id DESC)"
+    )
+    # Covered by the leading column of the activity indexes.
+    op.drop_index("ix_conversations_user_a_id", table_name="conversations")
+    op.drop_index("ix_conversations_user_b_id", table_name="conversations")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index("ix_conversations_user_b_id", "conversations", ["user_b_id"])
+    op.create_index("ix_conversations_user_a_id", "conversations", ["user_a_id"])
+    op.drop_index("ix_conversations_user_b_activity", table_name="conversations")
+    op.drop_index("ix_conversations_user_a_activity", table_name="conversations")
+    op.drop_constraint("fk_conversations_last_message_id", "conversations", type_="foreignkey")
+    op.drop_column("conversations", "last_message_at")
+    op.drop_column("conversations", "last_message_id")
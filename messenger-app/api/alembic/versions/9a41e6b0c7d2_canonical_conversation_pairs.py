@@ -0,0 +1,88 @@
+"""canonical conversation pairs
+
+Revision ID: 9a41e6b0c7d2
+Revises: 7d2a4c8e9f13
+Create Date: 2026-10-17 00:00:00.000000
+"""
+
+from collections.abc import Sequence
+
+from alembic import op  # type: ignore
+
+# revision identifiers, used by Alembic.
+revision: str = "9a41e6b0c7d2"
+down_revision: str | Sequence[str] | None = "7d2a4c8e9f13"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The LEAST/GREATEST unique index of be1d7d5318f9 was dropped again by
+    # a58300d40bad, so since then concurrent requests could create the same
+    # pair twice: fold duplicates into the oldest conversation of each pair.
+    # A database that still has the index simply has none to fold; the index
+    # itself gives way to the constraint below.
+    op.execute("DROP INDEX IF EXISTS uq_conversations_pair")
+    op.execute(
+        """
+        CREATE TEMPORARY TABLE conversation_duplicates ON COMMIT DROP AS
+        SELECT id, keeper_id FROM (
+            SELECT id,
+                   first_value(id) OVER (
+                       PARTITION BY LEAST(user_a_id, user_b_id), GREATEST(user_a_id, user_b_id)
+                       ORDER BY created_at, id
+                   ) AS keeper_id
+            FROM conversations
+        ) pairs
+        WHERE id <> keeper_id
+    """
+    )
+    op.execute(
+        """
+        UPDATE messages m SET conversation_id = d.keeper_id
+        FROM conversation_duplicates d WHERE m.conversation_id = d.id
+    """
+    )
+    op.execute(
+        """
+        UPDATE conversations c
+        SET last_message_at = GREATEST(
+            c.created_at,
+            (SELECT max(m.created_at) FROM messages m WHERE m.conversation_id = c.id)
+        ),
+        last_message_id = (
+            SELECT m.id FROM messages m
+            WHERE m.conversation_id = c.id AND m.deleted_at IS NULL
+            ORDER BY m.created_at DESC, m.id DESC
+            LIMIT 1
+        )
+        WHERE c.id IN (SELECT keeper_id FROM conversation_duplicates)
+    """
+    )
+    op.execute("DELETE FROM conversations WHERE id IN (SELECT id FROM conversation_duplicates)")
+
+    op.execute(
+        """
+        UPDATE conversations SET user_a_id = user_b_id, user_b_id = user_a_id
+        WHERE user_a_id > user_b_id
+    """
+    )
+    op.drop_constraint("ck_conversations_distinct_users", "conversations", type_="check")
+    op.create_check_constraint(
+        "ck_conversations_ordered_pair", "conversations", "user_a_id < user_b_id"
+    )
+    op.create_unique_constraint(
+        "uq_conversations_pair", "conversations", ["user_a_id", "user_b_id"]
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Back to the state a58300d40bad left: no pair uniqueness. Recreating its
+    # expression index here would make that revision's own downgrade fail.
+    op.drop_constraint("uq_conversations_pair", "conversations", type_="unique")
+    op.drop_constraint("ck_conversations_ordered_pair", "conversations", type_="check")
+    op.create_check_constraint(
+        "ck_conversations_distinct_users", "conversations", "user_a_id <> user_b_id"
+    )
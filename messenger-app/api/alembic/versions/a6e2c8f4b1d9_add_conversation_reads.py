@@ -0,0 +1,67 @@
+"""add conversation reads
+
+Revision ID: a6e2c8f4b1d9
+Revises: d3a9f6c1e8b5
+Create Date: 2026-10-17 00:00:00.000000
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+from alembic import op  # type: ignore
+
+# revision identifiers, used by Alembic.
+revision: str = "a6e2c8f4b1d9"
+down_revision: str | Sequence[str] | None = "d3a9f6c1e8b5"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "conversation_reads",
+        sa.Column("user_id", UUID(as_uuid=True), nullable=False),
+        sa.Column("conversation_id", UUID(as_uuid=True), nullable=False),
+        sa.Column("last_read_created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("last_read_message_id", UUID(as_uuid=True), nullable=False),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(["conversation_id"], ["conversations.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id", "conversation_id"),
+    )
+    op.create_index(
+        op.f("ix_conversation_reads_conversation_id"), "conversation_reads", ["conversation_id"]
+    )
+    # History from before read tracking counts as read, rather than every
+    # conversation turning up with a full badge.
+    op.execute(
+        """
+        INSERT INTO conversation_reads
+            (user_id, conversation_id, last_read_created_at, last_read_message_id)
+        SELECT u.user_id, c.id, c.last_message_created_at, c.last_message_id
+        FROM conversations c
+        CROSS JOIN LATERAL (VALUES (c.user_a_id), (c.user_b_id)) AS u (user_id)
+        WHERE c.last_message_id IS NOT NULL
+    """
+    )
+    op.create_index(
+        "ix_messages_conv_sender_unread",
+        "messages",
+        ["conversation_id", "sender_id", "created_at", "id"],
+        postgresql_where=sa.text("deleted_at IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_messages_conv_sender_unread", table_name="messages")
+    op.drop_index(op.f("ix_conversation_reads_conversation_id"), table_name="conversation_reads")
+    op.drop_table("conversation_reads")
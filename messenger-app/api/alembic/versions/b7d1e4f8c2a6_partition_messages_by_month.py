@@ -0,0 +1,230 @@
+"""partition messages by month
+
+Revision ID: b7d1e4f8c2a6
+Revises: f2c6d8e0a4b9
+Create Date: 2026-10-17 00:00:00.000000
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+from alembic import op  # type: ignore
+
+# revision identifiers, used by Alembic.
+revision: str = "b7d1e4f8c2a6"
+down_revision: str | Sequence[str] | None = "f2c6d8e0a4b9"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+COLUMNS = "id, conversation_id, sender_id, content, created_at, edited_at, deleted_at, seq"
+
+
+def _drop_inbound_foreign_keys() -> None:
+    op.drop_constraint("attachments_message_id_fkey", "attachments", type_="foreignkey")
+    op.drop_constraint("fk_conversations_last_message_id", "conversations", type_="foreignkey")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _drop_inbound_foreign_keys()
+    op.rename_table("messages", "messages_unpartitioned")
+    op.execute(
+        "ALTER TABLE messages_unpartitioned RENAME CONSTRAINT messages_pkey"
+        " TO messages_unpartitioned_pkey"
+    )
+    for name in (
+        "ix_messages_conversation_id",
+        "ix_messages_created_at",
+        "ix_messages_sender_id",
+        "ix_messages_conv_created",
+        "ix_messages_conv_seq",
+    ):
+        op.drop_index(name, table_name="messages_unpartitioned")
+
+    op.create_table(
+        "messages",
+        sa.Column("id", UUID(as_uuid=True), nullable=False),
+        sa.Column("conversation_id", UUID(as_uuid=True), nullable=False),
+        sa.Column("sender_id", UUID(as_uuid=True), nullable=False),
+        sa.Column("content", sa.Text(), nullable=True),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column("edited_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("deleted_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("seq", sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(["conversation_id"], ["conversations.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["sender_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id", "created_at"),
+        postgresql_partition_by="RANGE (created_at)",
+    )
+
+    # One partition per UTC month in [since, until); existing ones are skipped.
+    # Returns the names of the partitions it created.
+    op.execute(
+        """
+        CREATE FUNCTION messages_ensure_partitions(since timestamptz, until timestamptz)
+        RETURNS SETOF text AS $$
+        DECLARE
+            lo timestamptz := date_trunc('month', since AT TIME ZONE 'UTC') AT TIME ZONE 'UTC';
+            hi timestamptz;
+            name text;
+        BEGIN
+            WHILE lo < until LOOP
+                hi := lo + interval '1 month';
+                name := 'messages_p' || to_char(lo AT TIME ZONE 'UTC', 'YYYY_MM');
+                IF to_regclass(name) IS NULL THEN
+                    EXECUTE format(
+                        'CREATE TABLE %I PARTITION OF messages FOR VALUES FROM (%L) TO (%L)',
+                        name, lo, hi
+                    );
+                    RETURN NEXT name;
+                END IF;
+                lo := hi;
+            END LOOP;
+        END;
+        $$ LANGUAGE plpgsql
+    """
+    )
+    # History back to the oldest message, and three months ahead. There is no
+    # default partition: it would stop the planner from scanning partitions in
+    # created_at order, which lets a history page stop at the newest ones.
+    op.execute(
+        """
+        SELECT messages_ensure_partitions(
+            coalesce((SELECT min(created_at) FROM messages_unpartitioned), now()),
+            now() + interval '3 months'
+        )
+    """
+    )
+    op.execute(f"INSERT INTO messages ({COLUMNS}) SELECT {COLUMNS} FROM messages_unpartitioned")
+    op.drop_table("messages_unpartitioned")
+
+    # The composite index also serves conversation_id alone, and partition
+    # pruning replaces the created_at index.
+    op.create_index("ix_messages_conv_created", "messages", ["conversation_id", "created_at", "id"])
+    op.create_index("ix_messages_sender_id", "messages", ["sender_id"])
+    op.create_index("ix_messages_conv_seq", "messages", ["conversation_id", "seq"])
+
+    op.add_column(
+        "attachments",
+        sa.Column("message_created_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.execute(
+        """
+        UPDATE attachments a SET message_created_at = m.created_at
+        FROM messages m WHERE m.id = a.message_id
+    """
+    )
+    op.alter_column("attachments", "message_created_at", nullable=False)
+    op.create_foreign_key(
+        "fk_attachments_message",
+        "attachments",
+        "messages",
+        ["message_id", "message_created_at"],
+        ["id", "created_at"],
+        ondelete="CASCADE",
+    )
+
+    op.add_column(
+        "conversations",
+        sa.Column("last_message_created_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.execute(
+        """
+        UPDATE conversations c SET last_message_created_at = m.created_at
+        FROM messages m WHERE m.id = c.last_message_id
+    """
+    )
+    op.create_foreign_key(
+        "fk_conversations_last_message_id",
+        "conversations",
+        "messages",
+        ["last_message_id", "last_message_created_at"],
+        ["id", "created_at"],
+        ondelete="SET NULL",
+        deferrable=True,
+        initially="DEFERRED",
+    )
+
+    # Attachments of archived partitions (app.cli partitions --archive-before)
+    # move here. The trigger keeps their blobs referenced, so gc-blobs leaves
+    # the files alone. Columns added to attachments must be added here too.
+    op.execute("CREATE SCHEMA IF NOT EXISTS archive")
+    op.execute("CREATE TABLE archive.attachments (LIKE attachments INCLUDING DEFAULTS)")
+    op.execute(
+        """
+        CREATE TRIGGER archived_attachments_blob_refs
+        AFTER INSERT OR DELETE OR UPDATE OF sha256 ON archive.attachments
+        FOR EACH ROW EXECUTE FUNCTION blobs_track_refs()
+    """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TABLE archive.attachments")
+    op.drop_constraint("fk_conversations_last_message_id", "conversations", type_="foreignkey")
+    op.drop_column("conversations", "last_message_created_at")
+    op.drop_constraint("fk_attachments_message", "attachments", type_="foreignkey")
+    op.drop_column("attachments", "message_created_at")
+
+    op.rename_table("messages", "messages_partitioned")
+    for name in ("ix_messages_conv_created", "ix_messages_sender_id", "ix_messages_conv_seq"):
+        op.drop_index(name, table_name="messages_partitioned")
+    op.execute(
+        "ALTER TABLE messages_partitioned RENAME CONSTRAINT messages_pkey"
+        " TO messages_partitioned_pkey"
+    )
+    op.create_table(
+        "messages",
+        sa.Column("id", UUID(as_uuid=True), nullable=False),
+        sa.Column("conversation_id", UUID(as_uuid=True), nullable=False),
+        sa.Column("sender_id", UUID(as_uuid=True), nullable=False),
+        sa.Column("content", sa.Text(), nullable=True),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column("edited_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("deleted_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("seq", sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(["conversation_id"], ["conversations.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["sender_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.execute(f"INSERT INTO messages ({COLUMNS}) SELECT {COLUMNS} FROM messages_partitioned")
+    # Drops every partition with it.
+    op.drop_table("messages_partitioned")
+    op.execute("DROP FUNCTION messages_ensure_partitions(timestamptz, timestamptz)")
+
+    op.create_index("ix_messages_conversation_id", "messages", ["conversation_id"])
+    op.create_index("ix_messages_created_at", "messages", ["created_at"])
+    op.create_index("ix_messages_sender_id", "messages", ["sender_id"])
+    op.create_index("ix_messages_conv_created", "messages", ["conversation_id", "created_at", "id"])
+    op.create_index("ix_messages_conv_seq", "messages", ["conversation_id", "seq"], unique=True)
+    op.create_foreign_key(
+        "attachments_message_id_fkey",
+        "attachments",
+        "messages",
+        ["message_id"],
+        ["id"],
+        ondelete="CASCADE",
+    )
+    op.create_foreign_key(
+        "fk_conversations_last_message_id",
+        "conversations",
+        "messages",
+        ["last_message_id"],
+        ["id"],
+        ondelete="SET NULL",
+        deferrable=True,
+        initially="DEFERRED",
+    )
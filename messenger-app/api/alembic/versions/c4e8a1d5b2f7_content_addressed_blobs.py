@@ -0,0 +1,76 @@
+"""content addressed blobs
+
+Revision ID: c4e8a1d5b2f7
+Revises: 9a41e6b0c7d2
+Create Date: 2026-10-17 00:00:00.000000
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op  # type: ignore
+
+# revision identifiers, used by Alembic.
+revision: str = "c4e8a1d5b2f7"
+down_revision: str | Sequence[str] | None = "9a41e6b0c7d2"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "blobs",
+        sa.Column("sha256", sa.String(length=64), nullable=False),
+        sa.Column("size_bytes", sa.BigInteger(), nullable=False),
+        sa.Column("storage_key", sa.String(length=512), nullable=False),
+        sa.Column("ref_count", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("sha256"),
+    )
+    # Attachments stored before this revision keep their per-message paths
+    # and a NULL hash; they are not reference counted.
+    op.add_column("attachments", sa.Column("sha256", sa.String(length=64), nullable=True))
+    op.create_index(op.f("ix_attachments_sha256"), "attachments", ["sha256"], unique=False)
+    op.create_foreign_key("fk_attachments_sha256", "attachments", "blobs", ["sha256"], ["sha256"])
+
+    # Counting in triggers keeps ref_count right for cascaded deletes too
+    # (message -> attachments), which never pass through the ORM.
+    op.execute(
+        """
+        CREATE FUNCTION blobs_track_refs() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('DELETE', 'UPDATE') AND OLD.sha256 IS NOT NULL THEN
+                UPDATE blobs SET ref_count = ref_count - 1 WHERE sha256 = OLD.sha256;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.sha256 IS NOT NULL THEN
+                UPDATE blobs SET ref_count = ref_count + 1 WHERE sha256 = NEW.sha256;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER attachments_blob_refs
+        AFTER INSERT OR DELETE OR UPDATE OF sha256 ON attachments
+        FOR EACH ROW EXECUTE FUNCTION blobs_track_refs()
+    """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER attachments_blob_refs ON attachments")
+    op.execute("DROP FUNCTION blobs_track_refs()")
+    op.drop_constraint("fk_attachments_sha256", "attachments", type_="foreignkey")
+    op.drop_index(op.f("ix_attachments_sha256"), table_name="attachments")
+    op.drop_column("attachments", "sha256")
+    op.drop_table("blobs")
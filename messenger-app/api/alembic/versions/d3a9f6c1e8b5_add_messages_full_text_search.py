@@ -0,0 +1,38 @@
+"""add messages full text search
+
+Revision ID: d3a9f6c1e8b5
+Revises: b7d1e4f8c2a6
+Create Date: 2026-10-17 00:00:00.000000
+"""
+
+from collections.abc import Sequence
+
+from alembic import op  # type: ignore
+
+# revision identifiers, used by Alembic.
+revision: str = "d3a9f6c1e8b5"
+down_revision: str | Sequence[str] | None = "b7d1e4f8c2a6"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # GIN over the uuid column as well, so a search reads only the posting
+    # lists of one conversation instead of filtering every match in the table.
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+    # 'simple': no stemming or stop words, the same for every language.
+    op.execute(
+        "ALTER TABLE messages ADD COLUMN content_tsv tsvector"
+        " GENERATED ALWAYS AS (to_tsvector('simple', coalesce(content, ''))) STORED"
+    )
+    op.execute(
+        "CREATE INDEX ix_messages_conv_fts ON messages"
+        " USING gin (conversation_id, content_tsv) WHERE deleted_at IS NULL"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_messages_conv_fts", table_name="messages")
+    op.drop_column("messages", "content_tsv")
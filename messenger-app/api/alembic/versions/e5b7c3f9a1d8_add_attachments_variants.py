@@ -0,0 +1,29 @@
+"""add attachments variants
+
+Revision ID: e5b7c3f9a1d8
+Revises: c4e8a1d5b2f7
+Create Date: 2026-10-17 00:00:00.000000
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+
+from alembic import op  # type: ignore
+
+# revision identifiers, used by Alembic.
+revision: str = "e5b7c3f9a1d8"
+down_revision: str | Sequence[str] | None = "c4e8a1d5b2f7"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("attachments", sa.Column("variants", JSONB(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("attachments", "variants")
@@ -0,0 +1,79 @@
+"""add message change seq
+
+Revision ID: f2c6d8e0a4b9
+Revises: e5b7c3f9a1d8
+Create Date: 2026-10-17 00:00:00.000000
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op  # type: ignore
+
+# revision identifiers, used by Alembic.
+revision: str = "f2c6d8e0a4b9"
+down_revision: str | Sequence[str] | None = "e5b7c3f9a1d8"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "conversations",
+        sa.Column("last_seq", sa.BigInteger(), server_default=sa.text("0"), nullable=False),
+    )
+    op.add_column("messages", sa.Column("seq", sa.BigInteger(), nullable=True))
+    # Existing history gets sequence numbers in creation order.
+    op.execute(
+        """
+        UPDATE messages m SET seq = numbered.seq
+        FROM (
+            SELECT id, row_number() OVER (
+                PARTITION BY conversation_id ORDER BY created_at, id
+            ) AS seq
+            FROM messages
+        ) numbered
+        WHERE m.id = numbered.id
+    """
+    )
+    op.execute(
+        """
+        UPDATE conversations c SET last_seq = s.last_seq
+        FROM (SELECT conversation_id, max(seq) AS last_seq FROM messages GROUP BY conversation_id) s
+        WHERE c.id = s.conversation_id
+    """
+    )
+    op.alter_column("messages", "seq", nullable=False)
+    op.create_index("ix_messages_conv_seq", "messages", ["conversation_id", "seq"], unique=True)
+
+    # The send path points the conversation at the new message before
+    # inserting it, in the same statement that allocates its seq.
+    op.drop_constraint("fk_conversations_last_message_id", "conversations", type_="foreignkey")
+    op.create_foreign_key(
+        "fk_conversations_last_message_id",
+        "conversations",
+        "messages",
+        ["last_message_id"],
+        ["id"],
+        ondelete="SET NULL",
+        deferrable=True,
+        initially="DEFERRED",
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint("fk_conversations_last_message_id", "conversations", type_="foreignkey")
+    op.create_foreign_key(
+        "fk_conversations_last_message_id",
+        "conversations",
+        "messages",
+        ["last_message_id"],
+        ["id"],
+        ondelete="SET NULL",
+    )
+    op.drop_index("ix_messages_conv_seq", table_name="messages")
+    op.drop_column("messages", "seq")
+    op.drop_column("conversations", "last_seq")
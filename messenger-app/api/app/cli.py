@@ -0,0 +1,68 @@
+"""
+Maintenance commands, run inside the API container:
+
+    python -m app.cli gc-blobs [--grace SECONDS]
+    python -m app.cli partitions [--ahead MONTHS] [--archive-before YYYY-MM-DD]
+"""
+
+import argparse
+import asyncio
+import sys
+from datetime import UTC, datetime
+
+from app.core.db import SessionLocal, engine
+from app.services.partitions import DEFAULT_MONTHS_AHEAD, archive_partitions, ensure_partitions
+from app.services.storage import GC_GRACE_SECONDS, collect_garbage
+
+
+async def _gc_blobs(args: argparse.Namespace) -> None:
+    async with SessionLocal() as db:
+        removed = await collect_garbage(db, grace=args.grace)
+    sys.stdout.write(f"removed {removed} blob(s)\n")
+
+
+async def _partitions(args: argparse.Namespace) -> None:
+    async with SessionLocal() as db:
+        for name in await ensure_partitions(db, args.ahead):
+            sys.stdout.write(f"created {name}\n")
+        if args.archive_before is not None:
+            for name in await archive_partitions(db, args.archive_before):
+                sys.stdout.write(f"archived {name}\n")
+
+
+def _date(value: str) -> datetime:
+    return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=UTC)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    gc = commands.add_parser("gc-blobs", help="delete unreferenced attachment blobs")
+    gc.add_argument("--grace", type=float, default=GC_GRACE_SECONDS)
+    gc.set_defaults(run=_gc_blobs)
+
+    parts = commands.add_parser(
+        "partitions", help="create upcoming messages partitions, archive old ones"
+    )
+    parts.add_argument("--ahead", type=int, default=DEFAULT_MONTHS_AHEAD, help="months")
+    parts.add_argument(
+        "--archive-before",
+        type=_date,
+        help="move months that end on or before this date to the archive schema",
+    )
+    parts.set_defaults(run=_partitions)
+
+    args = parser.parse_args(argv)
+
+    async def _run() -> None:
+        try:
+            await args.run(args)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(_run())
+
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,57 @@ from pydantic import BaseModel, validator
 
 class Settings(BaseModel):
     db_url: str = os.getenv("DATABASE_URL", "postgresql+psycopg://app:app@db:5432/app")
+    # Optional streaming replica for read-only endpoints. It is used only while its
+    # replay lag, polled every replica_check_interval seconds, stays within
+    # replica_max_lag; a user who wrote less than read_your_writes_window seconds
+    # ago reads from the primary.
+    db_replica_url: str | None = os.getenv("DATABASE_REPLICA_URL") or None
+    replica_max_lag: float = float(os.getenv("REPLICA_MAX_LAG", "2"))
+    replica_check_interval: float = float(os.getenv("REPLICA_CHECK_INTERVAL", "1"))
+    read_your_writes_window: float = float(os.getenv("READ_YOUR_WRITES_WINDOW", "5"))
     jwt_secret: str = os.getenv("JWT_SECRET", "change-me")
     jwt_alg: str = os.getenv("JWT_ALG", "HS256")
     access_token_expire_minutes: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+    bcrypt_rounds: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    # bcrypt runs in its own process pool; beyond max_pending queued hashes /auth answers 503.
+    password_hash_workers: int = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    password_hash_max_pending: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+    # Image attachment previews are rendered in their own process pool; beyond
+    # max_pending queued images new ones are skipped and served full size.
+    thumbnail_workers: int = int(os.getenv("THUMBNAIL_WORKERS", "1"))
+    thumbnail_max_pending: int = int(os.getenv("THUMBNAIL_MAX_PENDING", "64"))
+    # When set (e.g. "/_protected/"), attachment downloads are handed to nginx with
+    # X-Accel-Redirect under this internal prefix; otherwise the API streams them.
+    attachments_accel_prefix: str | None = os.getenv("ATTACHMENTS_ACCEL_PREFIX") or None
+    # Signed attachment links stay valid for one to two periods of this many seconds,
+    # and every link issued within one period is the same URL, so browsers can cache it.
+    attachment_url_ttl: int = int(os.getenv("ATTACHMENT_URL_TTL", "3600"))
+    # Report each request's SQL statement count in X-DB-Queries; with the strict
+    # flag, exceeding an endpoint's @query_budget raises instead of logging.
+    query_count_header: bool = os.getenv("QUERY_COUNT_HEADER", "0") == "1"
+    query_budget_strict: bool = os.getenv("QUERY_BUDGET_STRICT", "0") == "1"
+    # Decoded tokens and their users are cached per process for at most this long.
+    auth_cache_ttl: float = float(os.getenv("AUTH_CACHE_TTL", "60"))
+    auth_cache_size: int = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+    user_search_cache_ttl: float = float(os.getenv("USER_SEARCH_CACHE_TTL", "10"))
     cors_origins: str | list[str] = os.getenv("API_CORS_ORIGINS", "http://localhost")
+    # "memory" keeps WebSocket fan-out inside one process, "postgres" uses LISTEN/NOTIFY
+    # so that events reach sockets held by every API worker.
+    ws_broker: str = os.getenv("WS_BROKER", "memory")
+    # Outbound frames queued per socket: beyond ws_queue_max the overflow policy applies
+    # ("drop_oldest" or "close"); a socket above the high-water mark for longer than
+    # ws_slow_consumer_grace seconds is disconnected.
+    ws_queue_max: int = int(os.getenv("WS_QUEUE_MAX", "256"))
+    ws_queue_high_water: int = int(os.getenv("WS_QUEUE_HIGH_WATER", "64"))
+    ws_overflow_policy: str = os.getenv("WS_OVERFLOW_POLICY", "drop_oldest")
+    ws_slow_consumer_grace: float = float(os.getenv("WS_SLOW_CONSUMER_GRACE", "10"))
+    # Conversations one socket may be subscribed to at the same time.
+    ws_max_subscriptions: int = int(os.getenv("WS_MAX_SUBSCRIPTIONS", "200"))
+    # A user whose last socket closed is announced offline this many seconds later,
+    # unless they reconnect first; typing is broadcast at most once per interval
+    # per conversation and typist.
+    ws_presence_grace: float = float(os.getenv("WS_PRESENCE_GRACE", "5"))
+    ws_typing_interval: float = float(os.getenv("WS_TYPING_INTERVAL", "2"))
 
     @validator("cors_origins", pre=True)
     def parse_cors_origins(cls, v: str | list[str]) -> list[str]:
@@ -1,15 +1,178 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
 
 from .config import settings
+from .metrics import counter, gauge, histogram
+
+log = logging.getLogger(__name__)
+
+POOL_WAIT = histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection, including opening one.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0, 30.0),
+)
+POOL_TIMEOUTS = counter("db_pool_checkout_timeouts_total", "Checkouts that gave up waiting.")
+
+# QueuePool._do_get retries by calling itself; only the outermost call is timed.
+_in_checkout: ContextVar[bool] = ContextVar("in_checkout", default=False)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    def _do_get(self) -> ConnectionPoolEntry:
+        if _in_checkout.get():
+            return super()._do_get()
+        token = _in_checkout.set(True)
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - start)
+            _in_checkout.reset(token)
 
-engine = create_engine(settings.db_url, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+engine = create_async_engine(settings.db_url, pool_pre_ping=True, poolclass=InstrumentedPool)
+# Objects stay usable after commit: lazy refreshes would need an implicit await.
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
 
-def get_db():
-    db = SessionLocal()
-    try:
+# Read at scrape time from whatever pool the engine holds (dispose() replaces it).
+gauge("db_pool_size", "Configured pool size.", fn=lambda: engine.pool.size())  # type: ignore[attr-defined]
+gauge(
+    "db_pool_checked_out",
+    "Connections currently checked out.",
+    fn=lambda: engine.pool.checkedout(),  # type: ignore[attr-defined]
+)
+gauge(
+    "db_pool_overflow",
+    "Connections open beyond the pool size.",
+    fn=lambda: max(engine.pool.overflow(), 0),  # type: ignore[attr-defined]
+)
+
+
+async def get_db() -> AsyncIterator[AsyncSession]:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+# Seconds the replica is behind, 0 when it has replayed everything it received
+# (pg_last_xact_replay_timestamp alone keeps growing while the primary is idle),
+# and 0 for a server that is not in recovery at all.
+REPLICA_LAG = text(
+    "SELECT CASE"
+    " WHEN NOT pg_is_in_recovery() THEN 0"
+    " WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+    " ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+    " END"
+)
+
+DB_READS = counter("db_read_sessions_total", "Read-only sessions by target.", ("target",))
+
+
+class ReplicaMonitor:
+    """
+    Polls the replica in the background. Reads are routed to it only while the
+    last check succeeded and found it within ``max_lag`` seconds; a failed query
+    on a replica session takes it out of rotation until the next good check.
+    """
+
+    def __init__(self, engine: AsyncEngine, interval: float, max_lag: float) -> None:
+        self.engine = engine
+        self.interval = interval
+        self.max_lag = max_lag
+        self.up = False
+        self.lag = 0.0
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def usable(self) -> bool:
+        return self.up and self.lag <= self.max_lag
+
+    def mark_down(self) -> None:
+        self.up = False
+
+    async def check(self) -> None:
+        was_usable = self.usable
+        try:
+            async with asyncio.timeout(self.interval + 1):
+                async with self.engine.connect() as conn:
+                    self.lag = float(await conn.scalar(REPLICA_LAG) or 0)
+            self.up = True
+        except Exception:
+            log.debug("replica check failed", exc_info=True)
+            self.up = False
+        if was_usable and not self.usable:
+            log.warning("replica out of rotation (up=%s, lag=%.1fs)", self.up, self.lag)
+
+    async def start(self) -> None:
+        await self.check()
+        self._task = asyncio.create_task(self._poll())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        await self.engine.dispose()
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.check()
+
+
+replica_engine: AsyncEngine | None = None
+ReplicaSessionLocal: async_sessionmaker[AsyncSession] | None = None
+replica_monitor: ReplicaMonitor | None = None
+if settings.db_replica_url:
+    replica_engine = create_async_engine(settings.db_replica_url, pool_pre_ping=True)
+    ReplicaSessionLocal = async_sessionmaker(
+        replica_engine, autoflush=False, expire_on_commit=False
+    )
+    replica_monitor = ReplicaMonitor(
+        replica_engine, settings.replica_check_interval, settings.replica_max_lag
+    )
+    gauge(
+        "db_replica_up",
+        "1 while reads may go to the replica.",
+        fn=lambda: replica_monitor.usable,  # type: ignore[union-attr]
+    )
+    gauge(
+        "db_replica_lag_seconds",
+        "Replay lag found by the last replica check.",
+        fn=lambda: replica_monitor.lag,  # type: ignore[union-attr]
+    )
+
+
+@asynccontextmanager
+async def read_session(pinned: bool = False) -> AsyncIterator[AsyncSession]:
+    """
+    A session for read-only work: on the replica when one is configured and
+    healthy, unless ``pinned`` asks for the primary's up-to-date view.
+    """
+    if pinned or replica_monitor is None or not replica_monitor.usable:
+        DB_READS.inc(target="primary")
+        async with SessionLocal() as db:
+            yield db
+        return
+    assert ReplicaSessionLocal is not None
+    DB_READS.inc(target="replica")
+    async with ReplicaSessionLocal() as db:
+        try:
+            yield db
+        except (exc.OperationalError, exc.InterfaceError):
+            replica_monitor.mark_down()
+            raise
@@ -0,0 +1,49 @@
+import base64
+import binascii
+import math
+from datetime import datetime
+from uuid import UUID
+
+
+def _encode(raw: str) -> str:
+    return base64.urlsafe_b64encode(raw.encode()).rstrip(b"=").decode()
+
+
+def _decode(cursor: str) -> str:
+    try:
+        return base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError) as err:
+        raise ValueError("Bad cursor") from err
+
+
+def _parse_position(raw: str) -> tuple[datetime, UUID]:
+    ts, sep, id_ = raw.partition("|")
+    if not sep:
+        raise ValueError("Bad cursor")
+    created_at = datetime.fromisoformat(ts)
+    if created_at.tzinfo is None:
+        raise ValueError("Bad cursor")
+    return created_at, UUID(id_)
+
+
+def encode_cursor(created_at: datetime, id_: UUID) -> str:
+    """Opaque keyset cursor over ``(created_at, id)``."""
+    return _encode(f"{created_at.isoformat()}|{id_}")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """Inverse of ``encode_cursor``. Raises ``ValueError`` on malformed input."""
+    return _parse_position(_decode(cursor))
+
+
+def encode_search_cursor(rank: float, created_at: datetime, id_: UUID) -> str:
+    """Opaque keyset cursor over ``(rank, created_at, id)`` for search results."""
+    return _encode(f"{rank!r}|{created_at.isoformat()}|{id_}")
+
+
+def decode_search_cursor(cursor: str) -> tuple[float, datetime, UUID]:
+    """Inverse of ``encode_search_cursor``. Raises ``ValueError`` on malformed input."""
+    rank, sep, rest = _decode(cursor).partition("|")
+    if not sep or not math.isfinite(value := float(rank)):
+        raise ValueError("Bad cursor")
+    return (value, *_parse_position(rest))
@@ -0,0 +1,121 @@
+"""
+Per-request SQL statement counting.
+
+A listener on the engine bumps every counter open in the current context, so
+any code path can be measured with ``count_queries()`` (tests use it as a
+fixture), including requests that are also counted by the middleware.
+``QueryCountMiddleware`` opens a counter per request, optionally reports it in
+``X-DB-Queries`` and checks it against the budget the endpoint declared with
+``@query_budget(n)``.
+"""
+
+import logging
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, TypeVar
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .db import engine, replica_engine
+
+log = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+BUDGET_ATTR = "__query_budget__"
+
+
+class QueryCounter:
+    def __init__(self, parent: "QueryCounter | None" = None) -> None:
+        self.count = 0
+        self.statements: list[str] = []
+        self.parent = parent
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+_current: ContextVar[QueryCounter | None] = ContextVar("query_counter", default=None)
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryCounter]:
+    counter = QueryCounter(_current.get())
+    token = _current.set(counter)
+    try:
+        yield counter
+    finally:
+        _current.reset(token)
+
+
+def _count(
+    _conn: Any, _cursor: Any, statement: str, _params: Any, _context: Any, _many: bool
+) -> None:
+    counter = _current.get()
+    while counter is not None:
+        counter.count += 1
+        counter.statements.append(statement)
+        counter = counter.parent
+
+
+for _engine in (engine, replica_engine):
+    if _engine is not None:
+        event.listen(_engine.sync_engine, "before_cursor_execute", _count)
+
+
+def query_budget(limit: int) -> Callable[[F], F]:
+    """Declare how many statements one call of the decorated endpoint may run."""
+
+    def mark(endpoint: F) -> F:
+        setattr(endpoint, BUDGET_ATTR, limit)
+        return endpoint
+
+    return mark
+
+
+class QueryCountMiddleware:
+    """
+    Counts the statements run until the response is complete; background
+    tasks that run afterwards are not charged to the request. Over-budget
+    requests are logged, or raise ``QueryBudgetExceeded`` when ``strict``.
+    """
+
+    HEADER = "X-DB-Queries"
+
+    def __init__(self, app: ASGIApp, header: bool = False, strict: bool = False) -> None:
+        self.app = app
+        self.header = header
+        self.strict = strict
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        final: int | None = None
+
+        with count_queries() as counter:
+
+            async def send_counted(message: Message) -> None:
+                nonlocal final
+                if message["type"] == "http.response.start" and self.header:
+                    MutableHeaders(scope=message)[self.HEADER] = str(counter.count)
+                elif message["type"] == "http.response.body" and not message.get("more_body"):
+                    final = counter.count
+                await send(message)
+
+            await self.app(scope, receive, send_counted)
+
+        limit = getattr(scope.get("endpoint"), BUDGET_ATTR, None)
+        used = counter.count if final is None else final
+        if limit is None or used <= limit:
+            return
+        detail = f"{scope['method']} {scope['path']} ran {used} queries, budget is {limit}"
+        if self.strict:
+            statements = "\n".join(counter.statements[:used])
+            raise QueryBudgetExceeded(f"{detail}:\n{statements}")
+        log.warning(detail)
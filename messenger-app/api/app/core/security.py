@@ -1,11 +1,23 @@
+import hashlib
+import hmac
+import time
 from datetime import UTC, datetime, timedelta
+from uuid import UUID
 
 import jwt
 from passlib.context import CryptContext
 
 from .config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Pinning min/max to the configured cost flags any hash made with another cost
+# as needing an update, so changing BCRYPT_ROUNDS migrates hashes on login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.bcrypt_rounds,
+    bcrypt__min_rounds=settings.bcrypt_rounds,
+    bcrypt__max_rounds=settings.bcrypt_rounds,
+)
 
 
 def hash_password(password: str) -> str:
@@ -16,7 +28,35 @@ def verify_password(password: str, hashed: str) -> bool:
     return pwd_context.verify(password, hashed)
 
 
+def verify_and_update(password: str, hashed: str) -> tuple[bool, str | None]:
+    """Verify ``password``; also return a fresh hash if ``hashed`` uses outdated settings."""
+    return pwd_context.verify_and_update(password, hashed)
+
+
 def create_access_token(sub: str) -> str:
     expire = datetime.now(UTC) + timedelta(minutes=settings.access_token_expire_minutes)
     payload = {"sub": sub, "exp": expire}
     return jwt.encode(payload, settings.jwt_secret, algorithm=settings.jwt_alg)
+
+
+def download_signature(attachment_id: UUID, expires: int) -> str:
+    message = f"download:{attachment_id}:{expires}".encode()
+    return hmac.new(settings.jwt_secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def signed_download_path(attachment_id: UUID) -> str:
+    """
+    A link to the attachment that needs no other credentials, for ``<img src>``
+    and plain links. It names this one attachment and expires at the end of
+    the period after the current one.
+    """
+    ttl = settings.attachment_url_ttl
+    expires = (int(time.time()) // ttl + 2) * ttl
+    sig = download_signature(attachment_id, expires)
+    return f"/attachments/{attachment_id}?expires={expires}&sig={sig}"
+
+
+def verify_download(attachment_id: UUID, expires: int, sig: str) -> bool:
+    if expires <= time.time():
+        return False
+    return hmac.compare_digest(sig, download_signature(attachment_id, expires))
@@ -1,30 +1,174 @@
+import time
+from collections.abc import AsyncIterator
+from typing import Any
+from uuid import UUID
+
 import jwt
-from fastapi import Depends, Header, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import Depends, Header, HTTPException, Query, Request, status
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from app.core.cache import TTLCache
 from app.core.config import settings
-from app.core.db import get_db
+from app.core.db import get_db, read_session
+from app.core.metrics import gauge
+from app.core.security import verify_download
 from app.models.user import User
 
+# token -> user id, bounded by the token's own expiry
+token_cache: TTLCache[str, UUID] = TTLCache(settings.auth_cache_size, settings.auth_cache_ttl)
+# user id -> detached User, so the hot path skips the primary-key lookup
+user_cache: TTLCache[UUID, User] = TTLCache(settings.auth_cache_size, settings.auth_cache_ttl)
+# users who wrote recently read from the primary (read-your-writes); per process
+recent_writers: TTLCache[UUID, bool] = TTLCache(
+    settings.auth_cache_size, settings.read_your_writes_window
+)
 
-def get_current_user(
-    db: Session = Depends(get_db),
-    authorization: str = Header(None),
-) -> User:
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token")
+gauge("auth_token_cache_hits", "Tokens resolved from the cache.", fn=lambda: token_cache.hits)
+gauge("auth_token_cache_misses", "Tokens decoded and verified.", fn=lambda: token_cache.misses)
+gauge("auth_token_cache_size", "Tokens in the cache.", fn=lambda: len(token_cache))
+gauge("auth_user_cache_hits", "Users served from the cache.", fn=lambda: user_cache.hits)
+gauge("auth_user_cache_misses", "Users loaded from the database.", fn=lambda: user_cache.misses)
+gauge("auth_user_cache_size", "Users in the cache.", fn=lambda: len(user_cache))
+
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+# Request state key under which get_current_user leaves the author of a write.
+WRITER_STATE = "writer_id"
+
+
+def invalidate_user(user_id: UUID) -> None:
+    user_cache.pop(user_id)
+
+
+def pin_reads(user_id: UUID) -> None:
+    """Serve this user's reads from the primary for the read-your-writes window."""
+    recent_writers.set(user_id, True)
 
-    token = authorization.split(" ", 1)[1]
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _drop_cached_user(_mapper: Any, _conn: Any, target: User) -> None:
+    invalidate_user(target.id)
+
+
+def decode_token(token: str) -> UUID:
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        return user_id
     try:
         payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_alg])
-        user_id = payload.get("sub")
-    except jwt.PyJWTError as err:
+        user_id = UUID(payload.get("sub"))
+    except (jwt.PyJWTError, TypeError, ValueError) as err:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token",
         ) from err
+    exp = payload.get("exp")
+    token_cache.set(token, user_id, ttl=exp - time.time() if exp else None)
+    return user_id
+
+
+async def _user_for_token(db: AsyncSession, token: str) -> User:
+    user_id = decode_token(token)
 
-    user = db.get(User, user_id)
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+    # Detach it: the cached instance outlives this session and is shared read-only.
+    db.expunge(user)
+    user_cache.set(user_id, user)
+    return user
+
+
+async def get_current_user(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    authorization: str = Header(None),
+) -> User:
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token")
+    user = await _user_for_token(db, authorization.split(" ", 1)[1])
+    if request.method not in SAFE_METHODS:
+        setattr(request.state, WRITER_STATE, user.id)
     return user
+
+
+class ReadYourWritesMiddleware:
+    """
+    Pins the reads of a user who sent a successful write request (see
+    ``pin_reads``) as its response starts: after the endpoint committed, and
+    before the client can follow up with a read.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+        state = scope.setdefault("state", {})
+
+        async def send_pinning(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                writer = state.get(WRITER_STATE)
+                if writer is not None:
+                    pin_reads(writer)
+            await send(message)
+
+        await self.app(scope, receive, send_pinning)
+
+
+async def get_read_db(authorization: str = Header(None)) -> AsyncIterator[AsyncSession]:
+    """
+    Session for read-only endpoints: the replica when it is healthy, the primary
+    for a caller who wrote within the read-your-writes window. Only the token is
+    looked at here; authentication itself is left to the user dependency.
+    """
+    pinned = False
+    if authorization and authorization.startswith("Bearer "):
+        try:
+            pinned = recent_writers.get(decode_token(authorization.split(" ", 1)[1])) is not None
+        except HTTPException:
+            pass
+    async with read_session(pinned) as db:
+        yield db
+
+
+async def get_current_reader(
+    db: AsyncSession = Depends(get_read_db),
+    authorization: str = Header(None),
+) -> User:
+    """``get_current_user`` for endpoints whose only query is the user lookup."""
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token")
+    return await _user_for_token(db, authorization.split(" ", 1)[1])
+
+
+async def get_download_user(
+    attachment_id: UUID,
+    db: AsyncSession = Depends(get_db),
+    authorization: str = Header(None),
+    expires: int | None = Query(None),
+    sig: str | None = Query(None),
+) -> User | None:
+    """
+    Like ``get_current_user``, but also accepts the signed link from
+    ``AttachmentOut.url``, which ``<img src>`` and plain links can use without
+    carrying the access token. A valid link returns ``None``: it was issued to
+    a member of the attachment's conversation.
+    """
+    if expires is not None and sig is not None:
+        if not verify_download(attachment_id, expires, sig):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED, detail="Link expired or invalid"
+            )
+        return None
+    if authorization and authorization.startswith("Bearer "):
+        return await _user_for_token(db, authorization.split(" ", 1)[1])
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token")
@@ -1,13 +1,42 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import PlainTextResponse
 
 from app import ws
 from app.core.config import settings
-from app.routers import auth, conversations, messages, users
-from app.services.storage import UPLOAD_ROOT
+from app.core.db import replica_monitor
+from app.core.metrics import REGISTRY, MetricsMiddleware
+from app.core.queries import QueryCountMiddleware
+from app.deps import ReadYourWritesMiddleware
+from app.routers import attachments, auth, conversations, messages, users
+from app.services.auth import password_hasher
+from app.services.partitions import partition_maintainer
+from app.services.thumbnails import thumbnail_pipeline
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    await ws.manager.start()
+    await ws.presence.start()
+    await partition_maintainer.start()
+    if replica_monitor is not None:
+        await replica_monitor.start()
+    try:
+        yield
+    finally:
+        if replica_monitor is not None:
+            await replica_monitor.stop()
+        await partition_maintainer.stop()
+        await ws.presence.stop()
+        await ws.manager.stop()
+        password_hasher.shutdown()
+        thumbnail_pipeline.shutdown()
 
-app = FastAPI(title="Messenger API")
+
+app = FastAPI(title="Messenger API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,16 +46,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(ReadYourWritesMiddleware)
+
+app.add_middleware(
+    QueryCountMiddleware,
+    header=settings.query_count_header,
+    strict=settings.query_budget_strict,
+)
+
+# Outermost, so the latency covers every other middleware too.
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(auth.router)
 app.include_router(conversations.router)
 app.include_router(messages.router)
 app.include_router(messages.msg_router)
+app.include_router(attachments.router)
 app.include_router(ws.router)
 app.include_router(users.router)
 
-app.mount("/uploads", StaticFiles(directory=str(UPLOAD_ROOT)), name="uploads")
-
 
 @app.get("/healthz")
 def health() -> dict[str, str]:
     return {"status": "ok"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics() -> PlainTextResponse:
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
@@ -1,13 +1,17 @@
 from .attachment import Attachment
 from .base import Base
+from .blob import Blob
 from .conversation import Conversation
+from .conversation_read import ConversationRead
 from .message import Message
 from .user import User
 
 __all__ = [
     "Attachment",
     "Base",
+    "Blob",
     "Conversation",
+    "ConversationRead",
     "Message",
     "User",
 ]
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 import uuid
+from typing import Any
 
-from sqlalchemy import DateTime, ForeignKey, Integer, String, func
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import DateTime, ForeignKey, ForeignKeyConstraint, Integer, String, func
+from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base
@@ -13,13 +14,32 @@ class Attachment(Base):
     __tablename__ = "attachments"
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    message_id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), ForeignKey("messages.id", ondelete="CASCADE"), index=True
-    )
+    message_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), index=True)
+    # The message's partition key, copied from it on flush through the relationship.
+    message_created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), nullable=False)
     filename: Mapped[str] = mapped_column(String(255), nullable=False)
     mime: Mapped[str] = mapped_column(String(100), nullable=False)
     size_bytes: Mapped[int] = mapped_column(Integer, nullable=False)
     storage_key: Mapped[str] = mapped_column(String(512), nullable=False)
+    # NULL for files stored before content addressing (per-message paths).
+    sha256: Mapped[str | None] = mapped_column(
+        String(64),
+        ForeignKey("blobs.sha256", name="fk_attachments_sha256"),
+        nullable=True,
+        index=True,
+    )
+    # {"thumb": {"key", "width", "height"}, ...}; NULL until rendered (or never, for non-images).
+    variants: Mapped[dict[str, Any] | None] = mapped_column(JSONB, nullable=True)
     created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
-    message = relationship("Message", back_populates="attachments")
+    message = relationship("Message", back_populates="attachments", lazy="raise_on_sql")
+
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["message_id", "message_created_at"],
+            ["messages.id", "messages.created_at"],
+            name="fk_attachments_message",
+            ondelete="CASCADE",
+        ),
+    )
+    __mapper_args__ = {"eager_defaults": True}
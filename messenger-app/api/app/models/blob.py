@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from sqlalchemy import BigInteger, DateTime, Integer, String, func, text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+
+class Blob(Base):
+    """
+    One stored file per distinct content. ``ref_count`` is maintained by
+    triggers on ``attachments`` so it also follows cascaded deletes.
+    """
+
+    __tablename__ = "blobs"
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    size_bytes: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    storage_key: Mapped[str] = mapped_column(String(512), nullable=False)
+    ref_count: Mapped[int] = mapped_column(Integer, nullable=False, server_default=text("0"))
+    created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
@@ -2,7 +2,17 @@ from __future__ import annotations
 
 import uuid
 
-from sqlalchemy import CheckConstraint, DateTime, ForeignKey, func
+from sqlalchemy import (
+    BigInteger,
+    CheckConstraint,
+    DateTime,
+    ForeignKey,
+    ForeignKeyConstraint,
+    Index,
+    UniqueConstraint,
+    func,
+    text,
+)
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -14,17 +24,70 @@ class Conversation(Base):
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_a_id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
+        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False
     )
     user_b_id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
+        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False
     )
     created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    # Inbox denormalization, maintained by the message write paths in the same
+    # transaction. last_message_id is the latest non-deleted message (preview);
+    # last_message_at is the time of the latest message, or of creation for an
+    # empty conversation, and is the inbox sort key. last_message_created_at
+    # is the preview's partition key (see Message).
+    last_message_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True), nullable=True)
+    last_message_created_at: Mapped[DateTime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    last_message_at: Mapped[DateTime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    # Change counter: every create, edit and delete of a message takes the next
+    # value and stamps it on the message (Message.seq).
+    last_seq: Mapped[int] = mapped_column(BigInteger, server_default=text("0"), nullable=False)
 
-    user_a = relationship("User", foreign_keys=[user_a_id])
-    user_b = relationship("User", foreign_keys=[user_b_id])
-    messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan")
+    # Lazy loads would run one query per row in listings: every read path
+    # eager-loads explicitly, and a forgotten option fails loudly instead.
+    user_a = relationship("User", foreign_keys=[user_a_id], lazy="raise_on_sql")
+    user_b = relationship("User", foreign_keys=[user_b_id], lazy="raise_on_sql")
+    last_message = relationship(
+        "Message",
+        foreign_keys=[last_message_id, last_message_created_at],
+        viewonly=True,
+        lazy="raise_on_sql",
+    )
+    messages = relationship(
+        "Message",
+        back_populates="conversation",
+        cascade="all, delete-orphan",
+        foreign_keys="Message.conversation_id",
+    )
 
     __table_args__ = (
-        CheckConstraint("user_a_id <> user_b_id", name="ck_conversations_distinct_users"),
+        ForeignKeyConstraint(
+            ["last_message_id", "last_message_created_at"],
+            ["messages.id", "messages.created_at"],
+            ondelete="SET NULL",
+            use_alter=True,
+            name="fk_conversations_last_message_id",
+            # Set before the message row exists, in the statement that allocates its seq.
+            deferrable=True,
+            initially="DEFERRED",
+        ),
+        # Canonical pair: user_a_id is always the smaller id, so each pair has
+        # exactly one spelling and the unique constraint covers both orders.
+        CheckConstraint("user_a_id < user_b_id", name="ck_conversations_ordered_pair"),
+        UniqueConstraint("user_a_id", "user_b_id", name="uq_conversations_pair"),
+        Index(
+            "ix_conversations_user_a_activity",
+            "user_a_id",
+            last_message_at.desc(),
+            id.desc(),
+        ),
+        Index(
+            "ix_conversations_user_b_activity",
+            "user_b_id",
+            last_message_at.desc(),
+            id.desc(),
+        ),
     )
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import uuid
+
+from sqlalchemy import DateTime, ForeignKey, func
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+
+class ConversationRead(Base):
+    """
+    A user's read watermark in a conversation: every message up to and
+    including ``(last_read_created_at, last_read_message_id)``, in history
+    order, has been read. It only ever moves forward.
+
+    The position is kept as plain values, not a foreign key to ``messages``:
+    it stays meaningful after that message is deleted or its partition archived.
+    """
+
+    __tablename__ = "conversation_reads"
+
+    # Leading user_id: also serves the cascade when a user is deleted.
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    conversation_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("conversations.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
+    )
+    last_read_created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), nullable=False)
+    last_read_message_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=False)
+    updated_at: Mapped[DateTime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
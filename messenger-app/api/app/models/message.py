@@ -1,31 +1,86 @@
 from __future__ import annotations
 
 import uuid
+from typing import Any
 
-from sqlalchemy import DateTime, ForeignKey, Text, func
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import BigInteger, Computed, DateTime, ForeignKey, Index, Text, func, text
+from sqlalchemy.dialects.postgresql import TSVECTOR, UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base
 
 
 class Message(Base):
+    """
+    Range-partitioned by month on ``created_at``, which is therefore part of
+    the primary key and of every foreign key pointing here. Partitions are
+    created ahead of time and archived by ``python -m app.cli partitions``.
+    """
+
     __tablename__ = "messages"
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     conversation_id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), ForeignKey("conversations.id", ondelete="CASCADE"), index=True
+        UUID(as_uuid=True), ForeignKey("conversations.id", ondelete="CASCADE")
     )
     sender_id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), index=True
     )
-    sender = relationship("User", backref="messages")
+    sender = relationship("User", backref="messages", lazy="raise_on_sql")
     content: Mapped[str | None] = mapped_column(Text, nullable=True)
     created_at: Mapped[DateTime] = mapped_column(
-        DateTime(timezone=True), server_default=func.now(), index=True
+        DateTime(timezone=True), server_default=func.now(), primary_key=True
     )
     edited_at: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True), nullable=True)
     deleted_at: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    # Sequence number of the latest change to this message within its
+    # conversation (see Conversation.last_seq); drives /sync.
+    seq: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    # Search document, maintained by Postgres. Left out of the mapping (see
+    # __mapper_args__) so that inserts and updates do not return it; queries
+    # use Message.__table__.c.content_tsv.
+    content_tsv: Mapped[Any] = mapped_column(
+        TSVECTOR, Computed("to_tsvector('simple', coalesce(content, ''))", persisted=True)
+    )
+
+    conversation = relationship(
+        "Conversation",
+        back_populates="messages",
+        foreign_keys=[conversation_id],
+        lazy="raise_on_sql",
+    )
+    attachments = relationship(
+        "Attachment",
+        back_populates="message",
+        cascade="all, delete-orphan",
+        lazy="raise_on_sql",
+    )
 
-    conversation = relationship("Conversation", back_populates="messages")
-    attachments = relationship("Attachment", back_populates="message", cascade="all, delete-orphan")
+    __table_args__ = (
+        # Also serves lookups by conversation_id alone (cascades, membership).
+        Index("ix_messages_conv_created", "conversation_id", "created_at", "id"),
+        # Not unique: a unique index on a partitioned table must include
+        # created_at. Allocation under the conversation row lock keeps it unique.
+        Index("ix_messages_conv_seq", "conversation_id", "seq"),
+        # Unread counts (see ConversationRead): the peer's visible messages
+        # after a watermark, counted from the index alone.
+        Index(
+            "ix_messages_conv_sender_unread",
+            "conversation_id",
+            "sender_id",
+            "created_at",
+            "id",
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+        # Needs btree_gin for the uuid column.
+        Index(
+            "ix_messages_conv_fts",
+            "conversation_id",
+            "content_tsv",
+            postgresql_using="gin",
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+    # created_at comes back from the INSERT itself (RETURNING).
+    __mapper_args__ = {"eager_defaults": True, "exclude_properties": ["content_tsv"]}
@@ -0,0 +1,100 @@
+from pathlib import PurePath
+from typing import Literal
+from urllib.parse import quote
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import FileResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.db import get_db
+from app.core.queries import query_budget
+from app.deps import get_download_user
+from app.models import Attachment, Conversation, Message, User
+from app.services.storage import UPLOAD_ROOT, key_path
+
+router = APIRouter(prefix="/attachments", tags=["attachments"])
+
+# A given URL always names the same bytes (content hash or a per-message
+# path), so browsers may keep it forever; private because it is authorized.
+CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+def _content_disposition(filename: str, inline: bool) -> str:
+    kind = "inline" if inline else "attachment"
+    fallback = filename.encode("ascii", "replace").decode().replace('"', "")
+    return f"{kind}; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """``If-None-Match`` uses the weak comparison: ``W/`` prefixes are ignored."""
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+@router.get("/{attachment_id}")
+@query_budget(2)
+async def download_attachment(
+    attachment_id: UUID,
+    request: Request,
+    variant: Literal["thumb", "preview"] | None = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User | None = Depends(get_download_user),
+):
+    """
+    Serve an attachment, or one of its renditions, to members of its
+    conversation or to holders of a signed link. With ``ATTACHMENTS_ACCEL_PREFIX``
+    set nginx sends the bytes (sendfile, Range); the API only authorizes.
+    """
+    row = (
+        await db.execute(
+            select(Attachment, Conversation.user_a_id, Conversation.user_b_id)
+            .join(
+                Message,
+                (Message.id == Attachment.message_id)
+                & (Message.created_at == Attachment.message_created_at),
+            )
+            .join(Conversation, Conversation.id == Message.conversation_id)
+            .where(Attachment.id == attachment_id, Message.deleted_at.is_(None))
+        )
+    ).first()
+    if row is None or (
+        current_user is not None and current_user.id not in (row.user_a_id, row.user_b_id)
+    ):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Attachment not found")
+    att: Attachment = row.Attachment
+
+    storage_key, mime, filename = att.storage_key, att.mime, att.filename
+    if variant is not None:
+        rendition = (att.variants or {}).get(variant)
+        if rendition is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Variant not found")
+        storage_key, mime = rendition["key"], "image/webp"
+        filename = f"{PurePath(filename).stem or 'image'}-{variant}.webp"
+
+    etag = f'"{att.sha256 or att.id.hex}{"-" + variant if variant else ""}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": CACHE_CONTROL,
+        "Content-Disposition": _content_disposition(
+            filename, inline=mime.startswith("image/") or mime == "application/pdf"
+        ),
+        "X-Content-Type-Options": "nosniff",
+    }
+    if _etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    path = key_path(storage_key)
+    if settings.attachments_accel_prefix:
+        headers["X-Accel-Redirect"] = settings.attachments_accel_prefix + quote(path)
+        return Response(media_type=mime, headers=headers)
+    # Without nginx in front: Starlette streams the file, Range included.
+    full = UPLOAD_ROOT / path
+    if not full.is_file():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Attachment not found")
+    return FileResponse(full, media_type=mime, headers=headers)
@@ -1,44 +1,60 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.db import get_db
-from app.core.security import create_access_token, hash_password, verify_password
+from app.core.queries import query_budget
+from app.core.security import create_access_token
+from app.deps import pin_reads
 from app.models.user import User
 from app.schemas.auth import RegisterIn, TokenOut
+from app.services.auth import password_hasher
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
 @router.post("/register", response_model=TokenOut, status_code=status.HTTP_201_CREATED)
-def register(payload: RegisterIn, db: Session = Depends(get_db)):
-    if (
-        db.query(User)
-        .filter((User.email == payload.email) | (User.username == payload.username))
-        .first()
-    ):
+@query_budget(3)
+async def register(payload: RegisterIn, db: AsyncSession = Depends(get_db)):
+    existing = await db.scalars(
+        select(User)
+        .where((User.email == payload.email) | (User.username == payload.username))
+        .limit(1)
+    )
+    if existing.first():
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User already exists")
 
+    password_hash = await password_hasher.hash(payload.password)
     user = User(
         email=payload.email,
         username=payload.username,
-        password_hash=hash_password(payload.password),
+        password_hash=password_hash,
     )
     db.add(user)
     try:
-        db.commit()
+        await db.commit()
     except IntegrityError as err:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="User already exists"
         ) from err
-    db.refresh(user)
+    # Their first requests must find the row even if the replica lags.
+    pin_reads(user.id)
     return TokenOut(access_token=create_access_token(str(user.id)))
 
 
 @router.post("/token", response_model=TokenOut)
-def login(username: str, password: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == username).first()
-    if not user or not verify_password(password, user.password_hash):
+@query_budget(2)
+async def login(username: str, password: str, db: AsyncSession = Depends(get_db)):
+    user = (await db.scalars(select(User).where(User.username == username).limit(1))).first()
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Bad credentials")
+    valid, new_hash = await password_hasher.verify(password, user.password_hash)
+    if not valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Bad credentials")
+    if new_hash:
+        # BCRYPT_ROUNDS changed since this hash was made: store it at the current cost.
+        user.password_hash = new_hash
+        await db.commit()
     return TokenOut(access_token=create_access_token(str(user.id)))
@@ -1,72 +1,276 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import and_, or_, select
-from sqlalchemy.orm import Session, joinedload
+from datetime import UTC, datetime
+from typing import Any, cast
+from uuid import UUID, uuid4
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from sqlalchemy import (
+    Select,
+    and_,
+    case,
+    func,
+    literal,
+    or_,
+    select,
+    tuple_,
+    union_all,
+)
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased, joinedload
 
 from app.core.db import get_db
-from app.deps import get_current_user
-from app.models import Conversation, User
-from app.schemas.conversation import ConversationCreateIn, ConversationOut
+from app.core.pagination import decode_cursor, encode_cursor
+from app.core.queries import query_budget
+from app.deps import get_current_user, get_read_db
+from app.models import Conversation, ConversationRead, Message, User
+from app.schemas.conversation import (
+    ConversationCreateIn,
+    ConversationOut,
+    ConversationPage,
+    ConversationReadIn,
+    ConversationReadOut,
+)
+from app.ws import manager, presence
 
 router = APIRouter(prefix="/conversations", tags=["conversations"])
 
+CONVERSATION_OPTIONS = (
+    joinedload(Conversation.user_a),
+    joinedload(Conversation.user_b),
+    joinedload(Conversation.last_message),
+)
+
+
+# Unread badges stop counting here: the count reads at most this many index
+# entries per conversation, however far behind the reader is.
+UNREAD_COUNT_CAP = 100
+# Lower bound for a user who has no watermark yet: everything is unread.
+NEVER_READ = (datetime.min.replace(tzinfo=UTC), UUID(int=0))
+
+# A concurrent request may insert the same pair between our snapshot and our
+# insert; the retry runs with a fresh snapshot and sees the committed row.
+GET_OR_CREATE_ATTEMPTS = 2
+
+
+def _get_or_create_stmt(user_a_id: UUID, user_b_id: UUID) -> Select[tuple[Conversation]]:
+    """
+    Single statement: insert the pair unless it exists (or the peer does not),
+    then return whichever row is there, with users and preview joined in.
+    """
+    table = Conversation.__table__
+    inserted = (
+        insert(Conversation)
+        .from_select(
+            ["id", "user_a_id", "user_b_id"],
+            select(
+                literal(uuid4(), PG_UUID(as_uuid=True)),
+                literal(user_a_id, PG_UUID(as_uuid=True)),
+                literal(user_b_id, PG_UUID(as_uuid=True)),
+            ).where(
+                select(func.count())
+                .select_from(User)
+                .where(User.id.in_([user_a_id, user_b_id]))
+                .scalar_subquery()
+                == 2
+            ),
+        )
+        .on_conflict_do_nothing(constraint="uq_conversations_pair")
+        .returning(*table.c)
+        .cte("inserted")
+    )
+    existing = select(*table.c).where(
+        Conversation.user_a_id == user_a_id, Conversation.user_b_id == user_b_id
+    )
+    rows = union_all(select(*inserted.c), existing).subquery()
+    conv = aliased(Conversation, rows)
+    return (
+        select(conv)
+        .options(joinedload(conv.user_a), joinedload(conv.user_b), joinedload(conv.last_message))
+        .limit(1)
+    )
+
 
 @router.post("", response_model=ConversationOut)
-def create_or_get_conversation(
+@query_budget(3)
+async def create_or_get_conversation(
     payload: ConversationCreateIn,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
+    if payload.peer_id == current_user.id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cannot chat with self")
+    user_a_id, user_b_id = sorted((current_user.id, payload.peer_id))
+    for _ in range(GET_OR_CREATE_ATTEMPTS):
+        conv = (await db.scalars(_get_or_create_stmt(user_a_id, user_b_id))).first()
+        if conv is not None:
+            await db.commit()
+            return conv
+        await db.rollback()
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Peer not found")
+
+
+@router.get("", response_model=ConversationPage)
+@query_budget(2)
+async def list_conversations(
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_user),
+    cursor: str | None = None,
+    limit: int = 50,
+):
+    """
+    The user's conversations, most recently active first. Each side of the pair
+    is read from its own (user_x_id, last_message_at, id) index in order and
+    the two short runs are merged, so the page costs two bounded index scans.
+    """
+    limit = max(1, min(limit, 100))
+    after = None
+    if cursor:
+        try:
+            last_at, last_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Bad cursor format") from None
+        after = tuple_(Conversation.last_message_at, Conversation.id) < tuple_(last_at, last_id)
+
+    sides = []
+    for column in (Conversation.user_a_id, Conversation.user_b_id):
+        side = select(Conversation.id, Conversation.last_message_at).where(
+            column == current_user.id
+        )
+        if after is not None:
+            side = side.where(after)
+        sides.append(
+            side.order_by(Conversation.last_message_at.desc(), Conversation.id.desc()).limit(
+                limit + 1
+            )
+        )
+    page = union_all(*(s.subquery().select() for s in sides)).subquery()
+
     stmt = (
-        select(Conversation)
-        .options(joinedload(Conversation.user_a), joinedload(Conversation.user_b))
+        select(Conversation, _unread_count(current_user.id))
+        .join(page, page.c.id == Conversation.id)
+        .outerjoin(
+            ConversationRead,
+            and_(
+                ConversationRead.user_id == current_user.id,
+                ConversationRead.conversation_id == Conversation.id,
+            ),
+        )
+        .options(*CONVERSATION_OPTIONS)
+        .order_by(page.c.last_message_at.desc(), page.c.id.desc())
+        .limit(limit + 1)
+    )
+    rows = list((await db.execute(stmt)).tuples().all())
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1][0]
+        next_cursor = encode_cursor(cast(datetime, last.last_message_at), last.id)
+    items = []
+    for conv, unread in rows:
+        item = ConversationOut.model_validate(conv)
+        item.unread_count = unread
+        peer_id = conv.user_b_id if conv.user_a_id == current_user.id else conv.user_a_id
+        item.peer_online = presence.is_online(peer_id)
+        items.append(item)
+    return ConversationPage(items=items, next_cursor=next_cursor)
+
+
+def _unread_count(user_id: UUID) -> Any:
+    """
+    Correlated count of the peer's visible messages after the user's watermark
+    (ConversationRead, outer-joined by the caller). Equality on conversation and
+    sender plus the row-value bound make it one range of the partial index
+    ix_messages_conv_sender_unread, and the LIMIT caps how much of it is read.
+    """
+    peer_id = case(
+        (Conversation.user_a_id == user_id, Conversation.user_b_id),
+        else_=Conversation.user_a_id,
+    )
+    after = tuple_(
+        func.coalesce(ConversationRead.last_read_created_at, NEVER_READ[0]),
+        func.coalesce(ConversationRead.last_read_message_id, NEVER_READ[1]),
+    )
+    unread = (
+        select(literal(1))
         .where(
-            or_(
-                and_(
+            Message.conversation_id == Conversation.id,
+            Message.sender_id == peer_id,
+            Message.deleted_at.is_(None),
+            tuple_(Message.created_at, Message.id) > after,
+        )
+        .limit(UNREAD_COUNT_CAP)
+        .correlate(Conversation, ConversationRead)
+        .subquery()
+    )
+    return select(func.count()).select_from(unread).scalar_subquery().label("unread_count")
+
+
+@router.post("/{conversation_id}/read", response_model=ConversationReadOut)
+@query_budget(4)
+async def mark_read(
+    background: BackgroundTasks,
+    conversation_id: UUID,
+    payload: ConversationReadIn,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Move the caller's read watermark up to ``message_id``. Idempotent: marking
+    an older message, or the same one again, leaves the watermark where it is
+    and writes nothing. An advance is broadcast to the conversation as
+    ``conversation:read``, which gives the peer its read receipts.
+    """
+    target = (
+        await db.execute(
+            select(Message.id, Message.created_at)
+            .join(Conversation, Conversation.id == Message.conversation_id)
+            .where(
+                Message.id == payload.message_id,
+                Message.conversation_id == conversation_id,
+                or_(
                     Conversation.user_a_id == current_user.id,
-                    Conversation.user_b_id == payload.peer_id,
-                ),
-                and_(
-                    Conversation.user_a_id == payload.peer_id,
                     Conversation.user_b_id == current_user.id,
                 ),
             )
         )
-    )
-    conv = db.scalars(stmt).first()
-    if conv:
-        return conv
-    if payload.peer_id == current_user.id:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cannot chat with self")
-    peer = db.get(User, payload.peer_id)
-    if not peer:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Peer not found")
-
-    conv = Conversation(user_a_id=current_user.id, user_b_id=payload.peer_id)
-    db.add(conv)
-    db.commit()
-    db.refresh(conv)
-    conv = db.scalars(
-        select(Conversation)
-        .options(joinedload(Conversation.user_a), joinedload(Conversation.user_b))
-        .where(Conversation.id == conv.id)
     ).first()
-    assert conv is not None
-    return conv
+    if target is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Message not found")
 
+    stmt = insert(ConversationRead).values(
+        user_id=current_user.id,
+        conversation_id=conversation_id,
+        last_read_created_at=target.created_at,
+        last_read_message_id=target.id,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ConversationRead.user_id, ConversationRead.conversation_id],
+        set_={
+            "last_read_created_at": stmt.excluded.last_read_created_at,
+            "last_read_message_id": stmt.excluded.last_read_message_id,
+            "updated_at": func.now(),
+        },
+        where=tuple_(stmt.excluded.last_read_created_at, stmt.excluded.last_read_message_id)
+        > tuple_(ConversationRead.last_read_created_at, ConversationRead.last_read_message_id),
+    ).returning(ConversationRead)
+    state = (await db.scalars(stmt)).first()
+    await db.commit()
 
-@router.get("", response_model=list[ConversationOut])
-def list_conversations(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
-):
-    stmt = (
-        select(Conversation)
-        .options(joinedload(Conversation.user_a), joinedload(Conversation.user_b))
-        .where(
-            (Conversation.user_a_id == current_user.id)
-            | (Conversation.user_b_id == current_user.id)
-        )
-        .order_by(Conversation.created_at.desc())
-        .limit(50)
+    if state is None:
+        # Already at or past this message.
+        state = await db.get(ConversationRead, (current_user.id, conversation_id))
+        return state
+
+    background.add_task(
+        manager.broadcast_json,
+        conversation_id,
+        {
+            "type": "conversation:read",
+            "conversation_id": str(conversation_id),
+            "user_id": str(current_user.id),
+            "message_id": str(target.id),
+            "created_at": target.created_at.isoformat(),
+        },
     )
-    return db.scalars(stmt).all()
+    return state
@@ -1,7 +1,9 @@
+import html
 import os
+from collections.abc import Sequence
 from datetime import UTC, datetime
-from typing import Annotated, cast
-from uuid import UUID
+from typing import Annotated, Any, cast
+from uuid import UUID, uuid4
 
 from fastapi import (
     APIRouter,
@@ -10,17 +12,39 @@ from fastapi import (
     File,
     Form,
     HTTPException,
+    Query,
+    Response,
     UploadFile,
     status,
 )
-from sqlalchemy import select
-from sqlalchemy.orm import Session, joinedload
+from pydantic import TypeAdapter
+from sqlalchemy import REAL, Select, case, func, literal, select, tuple_, update
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
 
 from app.core.db import get_db
-from app.deps import get_current_user
+from app.core.pagination import (
+    decode_cursor,
+    decode_search_cursor,
+    encode_cursor,
+    encode_search_cursor,
+)
+from app.core.queries import query_budget
+from app.deps import get_current_user, get_read_db
 from app.models import Attachment, Conversation, Message, User
-from app.schemas.message import MessageCreateOut, MessageOut, MessageUpdate
-from app.services.storage import save_uploads
+from app.schemas.message import (
+    MessageCreateOut,
+    MessageOut,
+    MessagePage,
+    MessageSearchHit,
+    MessageSearchPage,
+    MessageSyncPage,
+    MessageUpdate,
+)
+from app.schemas.user import UserOut
+from app.services.storage import register_blobs, save_uploads
+from app.services.thumbnails import thumbnail_pipeline
 from app.ws import manager
 
 router = APIRouter(prefix="/conversations/{conversation_id}/messages", tags=["messages"])
@@ -50,48 +74,310 @@ def validate_files(files: list[UploadFile]):
             )
 
 
-@router.get("", response_model=list[MessageOut])
-def get_messages(
+async def _get_message(db: AsyncSession, message_id: UUID) -> Message | None:
+    """Load a message with everything ``MessageOut`` and the access checks read."""
+    stmt = (
+        select(Message)
+        .options(
+            joinedload(Message.conversation),
+            joinedload(Message.sender),
+            selectinload(Message.attachments),
+        )
+        .where(Message.id == message_id)
+    )
+    return (await db.scalars(stmt)).first()
+
+
+async def _bump_seq(db: AsyncSession, conversation_id: UUID, **values: Any) -> int:
+    """
+    Take the conversation's next change number, applying ``values`` to the
+    conversation in the same statement. The row lock is held until commit, so
+    within a conversation seq order is commit order: a client that has seen a
+    seq can never later miss a smaller one.
+    """
+    stmt = (
+        update(Conversation)
+        .where(Conversation.id == conversation_id)
+        .values(last_seq=Conversation.last_seq + 1, **values)
+        .returning(Conversation.last_seq)
+        .execution_options(synchronize_session=False)
+    )
+    return (await db.execute(stmt)).scalar_one()
+
+
+async def _render_variants(
+    conversation_id: UUID, message_id: UUID, attachments: list[Attachment]
+) -> None:
+    """Runs after the response: clients swap in the previews as they arrive."""
+    for rendered in await thumbnail_pipeline.process(attachments):
+        await manager.broadcast_json(
+            conversation_id,
+            {
+                "type": "attachment:variants",
+                "message_id": str(message_id),
+                "attachment_id": str(rendered.attachment_id),
+                "variants": rendered.variants,
+            },
+        )
+
+
+# Read path for message lists: plain rows instead of ORM entities (no identity
+# map, no instrumentation), validated in one call by a schema built once.
+MESSAGE_LIST = TypeAdapter(list[MessageOut])
+
+ATTACHMENT_COLUMNS = (
+    Attachment.message_id,
+    Attachment.id,
+    Attachment.filename,
+    Attachment.mime,
+    Attachment.size_bytes,
+    Attachment.storage_key,
+    Attachment.variants,
+    Attachment.created_at,
+)
+
+
+def _message_rows() -> Select[Any]:
+    """Columns of ``MessageOut`` plus its sender, one row per message."""
+    return select(
+        Message.id,
+        Message.conversation_id,
+        Message.sender_id,
+        Message.content,
+        Message.created_at,
+        Message.edited_at,
+        Message.deleted_at,
+        Message.seq,
+        User.email.label("sender_email"),
+        User.username.label("sender_username"),
+        User.created_at.label("sender_created_at"),
+    ).join(User, User.id == Message.sender_id)
+
+
+async def _load_messages(db: AsyncSession, stmt: Select[Any]) -> list[MessageOut]:
+    """Run a ``_message_rows`` query and attach attachments with one more query."""
+    return await _build_messages(db, (await db.execute(stmt)).all())
+
+
+async def _build_messages(db: AsyncSession, rows: Sequence[Row[Any]]) -> list[MessageOut]:
+    """``MessageOut`` for each of ``rows``, in order; loads their attachments."""
+    if not rows:
+        return []
+    by_message: dict[UUID, list[dict[str, Any]]] = {}
+    attachments = await db.execute(
+        select(*ATTACHMENT_COLUMNS).where(Attachment.message_id.in_([r.id for r in rows]))
+    )
+    for a in attachments.mappings():
+        by_message.setdefault(a["message_id"], []).append(dict(a))
+    # A page has one or two senders: validate each once (EmailStr is by far the
+    # costliest field) and hand the instance to every message, as-is.
+    senders: dict[UUID, UserOut] = {}
+    for r in rows:
+        if r.sender_id not in senders:
+            senders[r.sender_id] = UserOut(
+                id=r.sender_id,
+                email=r.sender_email,
+                username=r.sender_username,
+                created_at=r.sender_created_at,
+            )
+    return MESSAGE_LIST.validate_python(
+        [
+            {
+                "id": r.id,
+                "conversation_id": r.conversation_id,
+                "sender_id": r.sender_id,
+                "sender": senders[r.sender_id],
+                "content": r.content,
+                "created_at": r.created_at,
+                "edited_at": r.edited_at,
+                "deleted_at": r.deleted_at,
+                "seq": r.seq,
+                "attachments": by_message.get(r.id, []),
+            }
+            for r in rows
+        ]
+    )
+
+
+@router.get("", response_model=MessagePage)
+@query_budget(4)
+async def get_messages(
     conversation_id: UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user),
     cursor: str | None = None,
     limit: int = 50,
 ):
-    conv = db.get(Conversation, conversation_id)
+    conv = await db.get(Conversation, conversation_id)
     if not conv or current_user.id not in (conv.user_a_id, conv.user_b_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Conversation not found",
         )
 
+    q = _message_rows().where(Message.conversation_id == conversation_id)
+
+    if cursor:
+        try:
+            created_at, message_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Bad cursor format") from None
+        # Row-value comparison: walks ix_messages_conv_created (conversation_id,
+        # created_at, id) directly and keeps ties on created_at across pages.
+        q = q.where(tuple_(Message.created_at, Message.id) < tuple_(created_at, message_id))
+
+    limit = max(1, min(limit, 100))
+    q = q.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1)
+    items = await _load_messages(db, q)
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    page = MessagePage.model_construct(items=items, next_cursor=next_cursor)
+    return Response(page.model_dump_json().encode(), media_type="application/json")
+
+
+@router.get("/sync", response_model=MessageSyncPage)
+@query_budget(4)
+async def sync_messages(
+    conversation_id: UUID,
+    after_seq: int = 0,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Messages created, edited or deleted after ``after_seq``, oldest change
+    first, each in its current state. A reconnecting client passes the highest
+    seq it has seen and repeats with ``last_seq`` while ``has_more`` is set;
+    the read is a range scan of ix_messages_conv_seq.
+    """
+    conv = await db.get(Conversation, conversation_id)
+    if not conv or current_user.id not in (conv.user_a_id, conv.user_b_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Conversation not found",
+        )
+
+    limit = max(1, min(limit, 500))
     q = (
-        select(Message)
-        .options(joinedload(Message.sender))
-        .where(Message.conversation_id == conversation_id)
+        _message_rows()
+        .where(Message.conversation_id == conversation_id, Message.seq > after_seq)
+        .order_by(Message.seq)
+        .limit(limit + 1)
+    )
+    items = await _load_messages(db, q)
+    has_more = len(items) > limit
+    items = items[:limit]
+    page = MessageSyncPage.model_construct(
+        items=items, last_seq=items[-1].seq if items else after_seq, has_more=has_more
+    )
+    return Response(page.model_dump_json().encode(), media_type="application/json")
+
+
+# Search runs against the generated messages.content_tsv column, through the
+# partial GIN index ix_messages_conv_fts (conversation_id, content_tsv).
+SEARCH_CONFIG = "simple"
+MAX_QUERY_LEN = 200
+# ts_headline marks matches with these; they are swapped for <mark> tags once
+# the excerpt has been HTML-escaped, and stripped from the content beforehand.
+HIGHLIGHT_START, HIGHLIGHT_STOP = "\x02", "\x03"
+HEADLINE_OPTIONS = (
+    f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, "
+    'MaxWords=24, MinWords=8, MaxFragments=2, FragmentDelimiter=" … "'
+)
+
+
+def _snippet(headline: str) -> str:
+    return (
+        html.escape(headline).replace(HIGHLIGHT_START, "<mark>").replace(HIGHLIGHT_STOP, "</mark>")
+    )
+
+
+@router.get("/search", response_model=MessageSearchPage)
+@query_budget(4)
+async def search_messages(
+    conversation_id: UUID,
+    q: Annotated[str, Query(min_length=1, max_length=MAX_QUERY_LEN)],
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_user),
+    cursor: str | None = None,
+    limit: int = 20,
+):
+    """
+    Messages of the conversation matching ``q`` (web-search syntax: words,
+    "quoted phrases", ``or``, ``-excluded``), best match first and newest first
+    among equals. Deleted messages are never found.
+    """
+    conv = await db.get(Conversation, conversation_id)
+    if not conv or current_user.id not in (conv.user_a_id, conv.user_b_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Conversation not found",
+        )
+
+    content_tsv = Message.__table__.c.content_tsv
+    query = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+    rank = func.ts_rank(content_tsv, query, type_=REAL)
+    headline = func.ts_headline(
+        SEARCH_CONFIG,
+        func.translate(Message.content, HIGHLIGHT_START + HIGHLIGHT_STOP, ""),
+        query,
+        HEADLINE_OPTIONS,
+    )
+    stmt = _message_rows().add_columns(rank.label("rank"), headline.label("headline"))
+    # Same predicate as the partial index, or the planner cannot use it.
+    stmt = stmt.where(
+        Message.conversation_id == conversation_id,
+        Message.deleted_at.is_(None),
+        content_tsv.op("@@")(query),
     )
 
     if cursor:
         try:
-            dt = datetime.fromisoformat(cursor)
-            q = q.where(Message.created_at < dt)
+            after_rank, created_at, message_id = decode_search_cursor(cursor)
         except ValueError:
             raise HTTPException(status_code=400, detail="Bad cursor format") from None
+        # Compared as real, like ts_rank's result: a float8 bound would not
+        # round-trip the rank of the last row exactly.
+        stmt = stmt.where(
+            tuple_(rank, Message.created_at, Message.id)
+            < tuple_(literal(after_rank).cast(REAL), literal(created_at), literal(message_id))
+        )
 
-    q = q.order_by(Message.created_at.desc(), Message.id.desc()).limit(min(limit, 100))
-    return db.scalars(q).all()
+    limit = max(1, min(limit, 100))
+    # ts_headline is costly: Postgres evaluates it after the sort, for the
+    # returned rows only.
+    stmt = stmt.order_by(rank.desc(), Message.created_at.desc(), Message.id.desc()).limit(limit + 1)
+    rows = (await db.execute(stmt)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_search_cursor(last.rank, last.created_at, last.id)
+    messages = await _build_messages(db, rows)
+    items = [
+        MessageSearchHit.model_construct(
+            message=message, rank=row.rank, snippet=_snippet(row.headline)
+        )
+        for message, row in zip(messages, rows, strict=True)
+    ]
+    page = MessageSearchPage.model_construct(items=items, next_cursor=next_cursor)
+    return Response(page.model_dump_json().encode(), media_type="application/json")
 
 
 @router.post("", response_model=MessageCreateOut)
+@query_budget(6)
 async def create_message(
     background: BackgroundTasks,
     conversation_id: UUID,
     content: Annotated[str | None, Form()] = None,
     files: Annotated[list[UploadFile] | None, File()] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    conv = db.get(Conversation, conversation_id)
+    conv = await db.get(Conversation, conversation_id)
     if not conv or current_user.id not in (conv.user_a_id, conv.user_b_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
     if not content and not files:
@@ -100,43 +386,86 @@ async def create_message(
     if content and len(content) > MAX_MESSAGE_LEN:
         raise HTTPException(status_code=400, detail="Message too long")
 
-    msg = Message(conversation_id=conversation_id, sender_id=current_user.id, content=content)
-    db.add(msg)
-    db.flush()
-
-    saved_keys: list[tuple[str, UploadFile, int]] = []
+    # Files go to disk before the conversation row is locked below.
+    attachments: list[Attachment] = []
     if files:
         validate_files(files)
-        saved_keys = await save_uploads(msg.id, files)
-
-        for storage_key, f, size in saved_keys:
-            att = Attachment(
-                message_id=msg.id,
-                filename=f.filename or "file",
-                mime=f.content_type or "application/octet-stream",
-                size_bytes=size,
-                storage_key=storage_key,
+        uploads = await save_uploads(files)
+        await register_blobs(db, uploads)
+        attachments = [
+            Attachment(
+                filename=saved.upload.filename or "file",
+                mime=saved.upload.content_type or "application/octet-stream",
+                size_bytes=saved.size,
+                storage_key=saved.storage_key,
+                sha256=saved.sha256,
             )
-            db.add(att)
+            for saved in uploads
+        ]
 
-    db.commit()
+    msg_id = uuid4()
+    # now() is the transaction timestamp, i.e. exactly the message's created_at.
+    # The comparison keeps a slower concurrent send from moving the inbox backwards.
+    newer = Conversation.last_message_at <= func.now()
+    seq = await _bump_seq(
+        db,
+        conversation_id,
+        last_message_id=case((newer, msg_id), else_=Conversation.last_message_id),
+        last_message_created_at=case(
+            (newer, func.now()), else_=Conversation.last_message_created_at
+        ),
+        last_message_at=func.greatest(Conversation.last_message_at, func.now()),
+    )
+    msg = Message(
+        id=msg_id,
+        conversation_id=conversation_id,
+        sender_id=current_user.id,
+        content=content,
+        seq=seq,
+        attachments=attachments,
+    )
+    db.add(msg)
+    await db.commit()
+
+    # Everything MessageOut needs is at hand (server defaults come back through
+    # RETURNING), so the event is built without reading the message back.
+    message = MessageOut.model_validate(
+        {
+            "id": msg.id,
+            "conversation_id": conversation_id,
+            "sender_id": current_user.id,
+            "sender": current_user,
+            "content": content,
+            "created_at": msg.created_at,
+            "edited_at": None,
+            "deleted_at": None,
+            "seq": seq,
+            "attachments": attachments,
+        }
+    ).model_dump(mode="json")
+    event = {"type": "message:new", "message_id": str(msg.id)}
     background.add_task(
         manager.broadcast_json,
         conversation_id,
-        {"type": "message:new", "message_id": str(msg.id)},
+        {**event, "message": message},
+        # Too large for the broker: clients fall back to fetching the page.
+        fallback=event,
     )
+    if attachments:
+        background.add_task(_render_variants, conversation_id, msg.id, attachments)
     return MessageCreateOut(id=msg.id)
 
 
 @msg_router.patch("/{message_id}", response_model=MessageOut)
-def update_message(
+@query_budget(5)
+async def update_message(
     background: BackgroundTasks,
     message_id: UUID,
     payload: MessageUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    msg = db.get(Message, message_id)
+    msg = await _get_message(db, message_id)
     if not msg or current_user.id not in (msg.conversation.user_a_id, msg.conversation.user_b_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Message not found")
     if msg.sender_id != current_user.id:
@@ -146,9 +475,8 @@ def update_message(
 
     msg.content = payload.content
     msg.edited_at = datetime.now(UTC)  # type: ignore[assignment]
-    db.add(msg)
-    db.commit()
-    db.refresh(msg)
+    msg.seq = await _bump_seq(db, msg.conversation_id)
+    await db.commit()
     assert msg.edited_at is not None
     edited_at = cast(datetime, msg.edited_at)
     background.add_task(
@@ -157,6 +485,7 @@ def update_message(
         {
             "type": "message:update",
             "id": str(msg.id),
+            "seq": msg.seq,
             "content": msg.content,
             "edited_at": edited_at.isoformat(),
         },
@@ -165,13 +494,14 @@ def update_message(
 
 
 @msg_router.delete("/{message_id}", response_model=MessageOut)
-def delete_message(
+@query_budget(5)
+async def delete_message(
     background: BackgroundTasks,
     message_id: UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    msg = db.get(Message, message_id)
+    msg = await _get_message(db, message_id)
     if not msg or current_user.id not in (msg.conversation.user_a_id, msg.conversation.user_b_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Message not found")
     if msg.sender_id != current_user.id:
@@ -179,9 +509,32 @@ def delete_message(
 
     if not msg.deleted_at:
         msg.deleted_at = datetime.now(UTC)  # type: ignore[assignment]
-        db.add(msg)
-        db.commit()
-        db.refresh(msg)
+        # If it was the inbox preview, fall back to the previous visible message.
+        previous = (
+            select(Message.id, Message.created_at)
+            .where(
+                Message.conversation_id == msg.conversation_id,
+                Message.deleted_at.is_(None),
+                Message.id != msg.id,
+            )
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .limit(1)
+            .subquery()
+        )
+        is_preview = Conversation.last_message_id == msg.id
+        msg.seq = await _bump_seq(
+            db,
+            msg.conversation_id,
+            last_message_id=case(
+                (is_preview, select(previous.c.id).scalar_subquery()),
+                else_=Conversation.last_message_id,
+            ),
+            last_message_created_at=case(
+                (is_preview, select(previous.c.created_at).scalar_subquery()),
+                else_=Conversation.last_message_created_at,
+            ),
+        )
+        await db.commit()
     assert msg.deleted_at is not None
     deleted_at = cast(datetime, msg.deleted_at)
     background.add_task(
@@ -190,6 +543,7 @@ def delete_message(
         {
             "type": "message:delete",
             "id": str(msg.id),
+            "seq": msg.seq,
             "deleted_at": deleted_at.isoformat(),
         },
     )
@@ -1,31 +1,72 @@
 from fastapi import APIRouter, Depends, Query
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import case, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import models, schemas
-from app.core.db import get_db
-from app.deps import get_current_user
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.queries import query_budget
+from app.deps import get_current_reader, get_current_user, get_read_db
 from app.models import User
 from app.schemas.user import UserOut
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+SEARCH_LIMIT = 20
+# Below this length there are no trigrams to look up: only prefix matches are served.
+TRGM_MIN_LEN = 3
+
+# Search-as-you-type repeats the same prefixes across users within seconds.
+search_cache: TTLCache[str, list[UserOut]] = TTLCache(1024, settings.user_search_cache_ttl)
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
 
 @router.get("/me", response_model=schemas.user.UserOut)
-def get_me(
-    current_user: models.user.User = Depends(get_current_user),
+@query_budget(1)
+async def get_me(
+    current_user: models.user.User = Depends(get_current_reader),
 ):
     return current_user
 
 
 @router.get("/search", response_model=list[UserOut])
-def search_users(
+@query_budget(2)
+async def search_users(
     q: str = Query(..., min_length=1, max_length=50, description="Username search query"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     _: User = Depends(get_current_user),
 ) -> list[UserOut]:
     """
-    Search users by username (case-insensitive, partial match).
+    Search users by username (case-insensitive). Exact matches come first, then
+    prefix matches, then other substring matches.
     """
-    stmt = select(User).where(User.username.ilike(f"%{q}%")).limit(20)
-    return db.execute(stmt).scalars().all()  # type: ignore[return-value]
+    needle = q.strip().lower()
+    if not needle:
+        return []
+    cached = search_cache.get(needle)
+    if cached is not None:
+        return cached
+
+    lowered = func.lower(User.username)
+    escaped = _escape_like(needle)
+    prefix = lowered.like(f"{escaped}%", escape="\\")
+    if len(needle) < TRGM_MIN_LEN:
+        # ix_users_username_lower_prefix
+        where = prefix
+    else:
+        # ix_users_username_trgm
+        where = User.username.ilike(f"%{escaped}%", escape="\\")
+    rank = case((lowered == needle, 0), (prefix, 1), else_=2)
+    stmt = (
+        select(User)
+        .where(where)
+        .order_by(rank, func.length(User.username), User.username)
+        .limit(SEARCH_LIMIT)
+    )
+    users = (await db.scalars(stmt)).all()
+    result = [UserOut.model_validate(u) for u in users]
+    search_cache.set(needle, result)
+    return result
@@ -1,8 +1,9 @@
 from datetime import datetime
 from uuid import UUID
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
+from app.schemas.message import MessagePreviewOut
 from app.schemas.user import UserOut
 
 
@@ -17,6 +18,32 @@ class ConversationOut(BaseModel):
     user_a: UserOut
     user_b: UserOut
     created_at: datetime
+    last_message_at: datetime
+    last_message: MessagePreviewOut | None = None
+    # Peer messages after the caller's read watermark, counted up to
+    # UNREAD_COUNT_CAP ("99+" territory). Only filled in by listings.
+    unread_count: int | None = None
+    # Whether the other participant has a WebSocket open, from the in-memory
+    # presence registry. Only filled in by listings.
+    peer_online: bool | None = None
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ConversationPage(BaseModel):
+    items: list[ConversationOut]
+    next_cursor: str | None = None
+
+
+class ConversationReadIn(BaseModel):
+    # The newest message the user has seen.
+    message_id: UUID
+
+
+class ConversationReadOut(BaseModel):
+    conversation_id: UUID
+    user_id: UUID
+    last_read_message_id: UUID
+    last_read_created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
@@ -1,21 +1,34 @@
 from datetime import datetime
 from uuid import UUID
 
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, ConfigDict, computed_field, field_validator
 
+from app.core.security import signed_download_path
 from app.schemas.user import UserOut
 
 
+class AttachmentVariantOut(BaseModel):
+    key: str
+    width: int
+    height: int
+
+
 class AttachmentOut(BaseModel):
     id: UUID
     filename: str
     mime: str
     size_bytes: int
     storage_key: str
+    variants: dict[str, AttachmentVariantOut] | None = None
     created_at: datetime
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def url(self) -> str:
+        """Signed download link; add ``&variant=`` for a rendition."""
+        return signed_download_path(self.id)
 
 
 class MessageOut(BaseModel):
@@ -27,10 +40,43 @@ class MessageOut(BaseModel):
     created_at: datetime
     edited_at: datetime | None
     deleted_at: datetime | None
+    seq: int
     attachments: list[AttachmentOut] = []
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class MessagePreviewOut(BaseModel):
+    id: UUID
+    sender_id: UUID
+    content: str | None
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class MessagePage(BaseModel):
+    items: list[MessageOut]
+    next_cursor: str | None = None
+
+
+class MessageSearchHit(BaseModel):
+    message: MessageOut
+    rank: float
+    # HTML-escaped content excerpt, matched terms wrapped in <mark></mark>.
+    snippet: str
+
+
+class MessageSearchPage(BaseModel):
+    items: list[MessageSearchHit]
+    next_cursor: str | None = None
+
+
+class MessageSyncPage(BaseModel):
+    items: list[MessageOut]
+    # Pass back as after_seq; equals the request's after_seq when nothing changed.
+    last_seq: int
+    has_more: bool
 
 
 class MessageCreateOut(BaseModel):
@@ -0,0 +1,44 @@
+from collections.abc import Callable
+from typing import Any, TypeVar
+
+from fastapi import HTTPException, status
+
+from app.core import security
+from app.core.config import settings
+from app.core.pool import BoundedProcessPool, PoolBusy
+
+T = TypeVar("T")
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a dedicated, bounded process pool. Hashing never touches the
+    event loop or Starlette's shared threadpool, so a login storm cannot starve
+    other endpoints; once ``max_pending`` hashes are queued, callers get a 503.
+    """
+
+    def __init__(self, workers: int, max_pending: int) -> None:
+        self.pool = BoundedProcessPool(workers, max_pending)
+
+    def shutdown(self) -> None:
+        self.pool.shutdown()
+
+    async def _run(self, fn: Callable[..., T], *args: Any) -> T:
+        try:
+            return await self.pool.run(fn, *args)
+        except PoolBusy:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication is busy, retry shortly",
+                headers={"Retry-After": "1"},
+            ) from None
+
+    async def hash(self, password: str) -> str:
+        return await self._run(security.hash_password, password)
+
+    async def verify(self, password: str, hashed: str) -> tuple[bool, str | None]:
+        """Returns ``(valid, new_hash)``; ``new_hash`` is set when the cost changed."""
+        return await self._run(security.verify_and_update, password, hashed)
+
+
+password_hasher = PasswordHasher(settings.password_hash_workers, settings.password_hash_max_pending)
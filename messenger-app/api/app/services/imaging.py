@@ -0,0 +1,61 @@
+"""
+Image resizing, kept free of application imports: it runs inside the
+thumbnail worker processes.
+"""
+
+import os
+from pathlib import Path
+from typing import Any
+from uuid import uuid4
+
+from PIL import Image, ImageOps
+
+# name -> longest edge in pixels, largest first so each variant is scaled
+# down from the previous one instead of from the original.
+VARIANTS = {"preview": 1280, "thumb": 320}
+WEBP_QUALITY = 80
+# A 10 MB PNG can decode to gigabytes; anything larger is not rendered.
+MAX_PIXELS = 40_000_000
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def render_variants(src: str, dest_dir: str) -> dict[str, dict[str, Any]]:
+    """
+    Write a WebP of every variant smaller than the original into ``dest_dir``
+    and return their dimensions. Images already smaller than a variant get no
+    file for it: clients show the original instead.
+    """
+    # Checked here, from the header and before anything is decoded, rather than
+    # by Pillow, which only warns up to twice its limit.
+    Image.MAX_IMAGE_PIXELS = None
+    out = Path(dest_dir)
+    made: dict[str, dict[str, Any]] = {}
+    with Image.open(src) as original:
+        if original.width * original.height > MAX_PIXELS:
+            raise ImageTooLarge(f"{original.width}x{original.height}")
+        largest = max(VARIANTS.values())
+        # JPEGs decode directly at a reduced scale, far cheaper than a full decode.
+        original.draft("RGB", (largest, largest))
+        img = ImageOps.exif_transpose(original)
+        if img.mode not in ("RGB", "RGBA"):
+            has_alpha = "A" in img.getbands() or "transparency" in img.info
+            img = img.convert("RGBA" if has_alpha else "RGB")
+        for name, edge in VARIANTS.items():
+            if max(img.size) <= edge:
+                continue
+            img = img.copy()
+            img.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+            out.mkdir(parents=True, exist_ok=True)
+            dest = out / f"{name}.webp"
+            tmp = out / f".{name}.{uuid4().hex}.part"
+            try:
+                img.save(tmp, "WEBP", quality=WEBP_QUALITY, method=4)
+                os.replace(tmp, dest)
+            except BaseException:
+                tmp.unlink(missing_ok=True)
+                raise
+            made[name] = {"width": img.width, "height": img.height}
+    return made
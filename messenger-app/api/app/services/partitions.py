@@ -0,0 +1,161 @@
+"""
+Maintenance of the monthly ``messages`` partitions (see the Message model).
+
+There is no default partition, so a message whose month has no partition
+cannot be stored: ``ensure_partitions`` has to run ahead of time. Every API
+worker does so at startup and then daily (``partition_maintainer``);
+``make partitions`` runs it by hand. ``archive_partitions`` takes whole months
+out of the live table into the ``archive`` schema, where they can be dumped
+and dropped.
+"""
+
+import asyncio
+import logging
+import re
+from datetime import UTC, datetime
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.db import SessionLocal
+
+log = logging.getLogger(__name__)
+
+ARCHIVE_SCHEMA = "archive"
+DEFAULT_MONTHS_AHEAD = 3
+MAINTENANCE_INTERVAL = 24 * 3600
+PARTITION_NAME = re.compile(r"^messages_p(\d{4})_(\d{2})$")
+# archive.attachments was created LIKE attachments; listed by name so that the
+# copy does not depend on column order. Columns added to attachments go here too.
+ATTACHMENT_COLUMNS = (
+    "id, message_id, message_created_at, filename, mime, size_bytes, storage_key,"
+    " sha256, variants, created_at"
+)
+
+
+def _month_bounds(name: str) -> tuple[datetime, datetime] | None:
+    match = PARTITION_NAME.match(name)
+    if match is None:
+        return None
+    year, month = int(match[1]), int(match[2])
+    lo = datetime(year, month, 1, tzinfo=UTC)
+    hi = datetime(year + month // 12, month % 12 + 1, 1, tzinfo=UTC)
+    return lo, hi
+
+
+async def ensure_partitions(
+    db: AsyncSession, months_ahead: int = DEFAULT_MONTHS_AHEAD
+) -> list[str]:
+    """Create the partitions from this month to ``months_ahead`` months out."""
+    # Workers start together: without the lock two of them could both find a
+    # partition missing and the second CREATE TABLE would fail.
+    await db.execute(text("SELECT pg_advisory_xact_lock(hashtext('messages_ensure_partitions'))"))
+    created = (
+        await db.scalars(
+            text(
+                "SELECT messages_ensure_partitions(now(), now() + make_interval(months => :ahead))"
+            ),
+            {"ahead": months_ahead},
+        )
+    ).all()
+    await db.commit()
+    return list(created)
+
+
+async def list_partitions(db: AsyncSession) -> list[str]:
+    rows = await db.scalars(
+        text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid"
+            " WHERE i.inhparent = 'messages'::regclass ORDER BY c.relname"
+        )
+    )
+    return list(rows.all())
+
+
+async def archive_partitions(db: AsyncSession, before: datetime) -> list[str]:
+    """
+    Detach every partition that ends on or before ``before`` and move it to the
+    archive schema, one transaction per partition.
+
+    Foreign keys into a partition block its detachment, so first the inbox
+    previews pointing into it are cleared (the conversation keeps its sort
+    time) and its attachments move to ``archive.attachments``, which keeps
+    their blobs referenced.
+    """
+    archived: list[str] = []
+    for name in await list_partitions(db):
+        bounds = _month_bounds(name)
+        if bounds is None or bounds[1] > before:
+            continue
+        lo, hi = bounds
+        params = {"lo": lo, "hi": hi}
+        await db.execute(
+            text(
+                "UPDATE conversations"
+                " SET last_message_id = NULL, last_message_created_at = NULL"
+                " WHERE last_message_created_at >= :lo AND last_message_created_at < :hi"
+            ),
+            params,
+        )
+        await db.execute(
+            text(
+                f"INSERT INTO {ARCHIVE_SCHEMA}.attachments ({ATTACHMENT_COLUMNS})"
+                f" SELECT {ATTACHMENT_COLUMNS} FROM attachments"
+                " WHERE message_created_at >= :lo AND message_created_at < :hi"
+            ),
+            params,
+        )
+        await db.execute(
+            text(
+                "DELETE FROM attachments"
+                " WHERE message_created_at >= :lo AND message_created_at < :hi"
+            ),
+            params,
+        )
+        # Names come from the catalog and match PARTITION_NAME: safe to inline.
+        await db.execute(text(f"ALTER TABLE messages DETACH PARTITION {name}"))
+        await db.execute(text(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}"))
+        await db.commit()
+        archived.append(name)
+    return archived
+
+
+class PartitionMaintainer:
+    """Runs ``ensure_partitions`` at startup and then every ``interval`` seconds."""
+
+    def __init__(
+        self, interval: float = MAINTENANCE_INTERVAL, months_ahead: int = DEFAULT_MONTHS_AHEAD
+    ) -> None:
+        self.interval = interval
+        self.months_ahead = months_ahead
+        self._task: asyncio.Task[None] | None = None
+
+    async def run_once(self) -> None:
+        try:
+            async with SessionLocal() as db:
+                created = await ensure_partitions(db, self.months_ahead)
+        except Exception:
+            # Three months of partitions are created ahead: a missed run is not
+            # urgent, the next one catches up.
+            log.exception("messages partition maintenance failed")
+            return
+        if created:
+            log.info("created messages partitions: %s", ", ".join(created))
+
+    async def start(self) -> None:
+        await self.run_once()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run_once()
+
+
+partition_maintainer = PartitionMaintainer()
@@ -0,0 +1,217 @@
+"""
+Online presence and typing indicators, kept in memory: nothing here touches
+the database.
+
+Presence is counted from the sockets ``WSManager`` holds per user. A user's
+first socket announces them online; when the last one closes, the offline
+announcement waits ``grace`` seconds and is dropped if the user reconnects in
+the meantime, so a page reload or a network blip sends nothing at all.
+
+Announcements go through the broker's ``presence`` channel, one message per
+change whatever the number of conversations, and every worker keeps the
+resulting view: which workers currently see each user online. Sockets are
+only told about the users they watch, i.e. the peers of the conversations
+they are subscribed to. Each worker re-announces its online users every
+``ANNOUNCE_EVERY`` seconds and claims that are not renewed expire, which
+covers workers that start late or die.
+
+Typing frames are throttled per conversation and typist: the first one is
+broadcast at once, later ones within ``typing_interval`` only as a single
+trailing update when the state changed (typing -> stopped). A typist who
+leaves the conversation without saying they stopped is broadcast as stopped.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+from uuid import UUID, uuid4
+
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    from app.ws import Connection, WSManager
+
+log = logging.getLogger(__name__)
+
+PRESENCE_CHANNEL = "presence"
+ANNOUNCE_EVERY = 30.0
+EXPIRE_AFTER = 3 * ANNOUNCE_EVERY
+# User ids per announcement: keeps a message under the NOTIFY payload limit.
+ANNOUNCE_BATCH = 150
+
+
+@dataclass
+class _Typing:
+    state: bool
+    sent: bool
+    window: "asyncio.Task[None] | None" = None
+
+
+class Presence:
+    def __init__(
+        self,
+        manager: "WSManager",
+        grace: float = settings.ws_presence_grace,
+        typing_interval: float = settings.ws_typing_interval,
+    ) -> None:
+        self.manager = manager
+        self.grace = grace
+        self.typing_interval = typing_interval
+        self.worker = uuid4().hex
+        # user -> worker -> monotonic time of its latest claim that the user is online
+        self.claims: dict[UUID, dict[str, float]] = {}
+        # user -> local sockets subscribed to a conversation with that user
+        self.watchers: dict[UUID, set[Connection]] = {}
+        self._going_offline: dict[UUID, asyncio.Task[None]] = {}
+        self._typing: dict[tuple[UUID, UUID], _Typing] = {}
+        # (conversation, user) whose latest typing broadcast said they are typing
+        self._shown: set[tuple[UUID, UUID]] = set()
+        self._announcer: asyncio.Task[None] | None = None
+
+    async def start(self) -> None:
+        await self.manager.listen(PRESENCE_CHANNEL, self._receive)
+        self._announcer = asyncio.create_task(self._announce_forever())
+
+    async def stop(self) -> None:
+        tasks = [self._announcer, *self._going_offline.values()]
+        tasks += [t.window for t in self._typing.values()]
+        for task in tasks:
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(*(t for t in tasks if t is not None), return_exceptions=True)
+        self._announcer = None
+        self._going_offline.clear()
+        self._typing.clear()
+        self._shown.clear()
+
+    def is_online(self, user_id: UUID) -> bool:
+        return bool(self.claims.get(user_id))
+
+    # -- presence -------------------------------------------------------------
+
+    async def connected(self, user_id: UUID) -> None:
+        """Call after ``WSManager.connect``."""
+        pending = self._going_offline.pop(user_id, None)
+        if pending is not None:
+            pending.cancel()  # reconnected within the grace period: nothing changed
+        elif len(self.manager.users.get(user_id, ())) == 1:
+            await self._announce(True, [user_id])
+
+    def disconnected(self, user_id: UUID) -> None:
+        """Call after ``WSManager.disconnect``."""
+        if user_id not in self.manager.users and user_id not in self._going_offline:
+            self._going_offline[user_id] = asyncio.create_task(self._offline_after_grace(user_id))
+
+    async def _offline_after_grace(self, user_id: UUID) -> None:
+        await asyncio.sleep(self.grace)
+        self._going_offline.pop(user_id, None)
+        if user_id not in self.manager.users:
+            await self._announce(False, [user_id])
+
+    def watch(self, conn: "Connection", user_id: UUID) -> None:
+        """Send ``conn`` the presence of ``user_id``, now and on every change."""
+        self.watchers.setdefault(user_id, set()).add(conn)
+        conn.offer(self._frame(user_id), key=f"presence:{user_id}")
+
+    def unwatch(self, conn: "Connection", user_id: UUID) -> None:
+        watching = self.watchers.get(user_id)
+        if watching is not None:
+            watching.discard(conn)
+            if not watching:
+                del self.watchers[user_id]
+
+    async def _announce(self, online: bool, user_ids: list[UUID]) -> None:
+        for i in range(0, len(user_ids), ANNOUNCE_BATCH):
+            batch = [str(u) for u in user_ids[i : i + ANNOUNCE_BATCH]]
+            message = {"worker": self.worker, "online": online, "user_ids": batch}
+            await self.manager.broker.publish(PRESENCE_CHANNEL, json.dumps(message))
+
+    async def _receive(self, data: str) -> None:
+        message = json.loads(data)
+        worker, online, now = message["worker"], message["online"], time.monotonic()
+        for user_id in map(UUID, message["user_ids"]):
+            was_online = self.is_online(user_id)
+            claims = self.claims.setdefault(user_id, {})
+            if online:
+                claims[worker] = now
+            else:
+                claims.pop(worker, None)
+            if not claims:
+                del self.claims[user_id]
+            if self.is_online(user_id) != was_online:
+                self._notify(user_id)
+
+    async def _announce_forever(self) -> None:
+        while True:
+            await asyncio.sleep(ANNOUNCE_EVERY)
+            try:
+                await self._announce(True, list(self.manager.users))
+            except Exception:
+                log.exception("presence announcement failed")
+            cutoff = time.monotonic() - EXPIRE_AFTER
+            for user_id, claims in list(self.claims.items()):
+                for worker, claimed_at in list(claims.items()):
+                    if claimed_at < cutoff:
+                        del claims[worker]
+                if not claims:
+                    del self.claims[user_id]
+                    self._notify(user_id)
+
+    def _frame(self, user_id: UUID) -> str:
+        return json.dumps(
+            {"type": "presence", "user_id": str(user_id), "online": self.is_online(user_id)}
+        )
+
+    def _notify(self, user_id: UUID) -> None:
+        watching = self.watchers.get(user_id)
+        if watching:
+            frame = self._frame(user_id)
+            # Keyed: a flap still queued on a slow socket collapses to the latest state.
+            for conn in watching:
+                conn.offer(frame, key=f"presence:{user_id}")
+
+    # -- typing ---------------------------------------------------------------
+
+    async def typing(self, conv_id: UUID, user_id: UUID, state: bool) -> None:
+        key = (conv_id, user_id)
+        entry = self._typing.get(key)
+        if entry is not None:
+            entry.state = state  # sent when the window closes, if it changed
+            return
+        entry = self._typing[key] = _Typing(state=state, sent=state)
+        entry.window = asyncio.create_task(self._typing_window(key))
+        await self._send_typing(key, state)
+
+    async def stop_typing(self, conv_id: UUID, user_id: UUID) -> None:
+        """
+        Call when ``user_id`` left ``conv_id`` (their last socket on it
+        unsubscribed or closed): peers last told they are typing learn they
+        stopped, through the same throttle as a stop frame.
+        """
+        key = (conv_id, user_id)
+        entry = self._typing.get(key)
+        if key in self._shown or (entry is not None and entry.state):
+            await self.typing(conv_id, user_id, False)
+
+    async def _typing_window(self, key: tuple[UUID, UUID]) -> None:
+        while True:
+            await asyncio.sleep(self.typing_interval)
+            entry = self._typing[key]
+            if entry.state == entry.sent:
+                del self._typing[key]
+                return
+            entry.sent = entry.state
+            await self._send_typing(key, entry.state)
+
+    async def _send_typing(self, key: tuple[UUID, UUID], state: bool) -> None:
+        conv_id, user_id = key
+        if state:
+            self._shown.add(key)
+        else:
+            self._shown.discard(key)
+        await self.manager.broadcast_json(
+            conv_id, {"type": "typing", "user_id": str(user_id), "typing": state}
+        )
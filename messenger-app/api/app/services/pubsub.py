@@ -0,0 +1,233 @@
+"""
+Pub/sub backends used by ``WSManager`` to fan events out across processes.
+
+Every API worker owns one broker. A worker subscribes to the channel of each
+room it currently holds sockets for, and ``publish`` delivers the payload to
+every subscribed worker (including the publisher itself) through the handler
+passed to ``start``.
+"""
+
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from collections.abc import Awaitable, Callable
+
+import psycopg
+from psycopg import sql
+from sqlalchemy.engine import make_url
+
+from app.core.config import settings
+
+log = logging.getLogger(__name__)
+
+Handler = Callable[[str, str], Awaitable[None]]
+
+
+class Broker(ABC):
+    # Largest payload (in bytes) the transport accepts, ``None`` if unbounded.
+    max_payload: int | None = None
+
+    @abstractmethod
+    async def start(self, handler: Handler) -> None: ...
+
+    @abstractmethod
+    async def stop(self) -> None: ...
+
+    @abstractmethod
+    async def subscribe(self, channel: str) -> None: ...
+
+    @abstractmethod
+    async def unsubscribe(self, channel: str) -> None: ...
+
+    @abstractmethod
+    async def publish(self, channel: str, data: str) -> None: ...
+
+
+class InMemoryBroker(Broker):
+    """
+    Process-local broker. Brokers sharing the same ``hub`` behave like workers
+    attached to the same bus, which is enough to exercise fan-out in tests.
+    """
+
+    def __init__(self, hub: dict[str, set["InMemoryBroker"]] | None = None) -> None:
+        self.hub: dict[str, set[InMemoryBroker]] = hub if hub is not None else {}
+        self._handler: Handler | None = None
+
+    async def start(self, handler: Handler) -> None:
+        self._handler = handler
+
+    async def stop(self) -> None:
+        for subscribers in self.hub.values():
+            subscribers.discard(self)
+        self._handler = None
+
+    async def subscribe(self, channel: str) -> None:
+        self.hub.setdefault(channel, set()).add(self)
+
+    async def unsubscribe(self, channel: str) -> None:
+        subscribers = self.hub.get(channel)
+        if subscribers is not None:
+            subscribers.discard(self)
+            if not subscribers:
+                self.hub.pop(channel, None)
+
+    async def publish(self, channel: str, data: str) -> None:
+        for broker in list(self.hub.get(channel, ())):
+            if broker._handler is not None:
+                await broker._handler(channel, data)
+
+
+class PostgresBroker(Broker):
+    """
+    LISTEN/NOTIFY broker. One autocommit connection listens for the channels of
+    the rooms this worker holds, a second one publishes. LISTEN/UNLISTEN
+    commands are queued and applied by the listener loop in submission order,
+    so a quick disconnect/reconnect of the same room cannot reorder them.
+    Queuing a command wakes the loop, so a subscribe does not wait for the
+    next notification to arrive.
+    """
+
+    # NOTIFY payloads must be shorter than 8000 bytes in the default build.
+    max_payload = 7999
+    RECONNECT_DELAY = 1.0
+
+    def __init__(self, dsn: str) -> None:
+        self.dsn = dsn
+        self.channels: set[str] = set()
+        self._handler: Handler | None = None
+        self._pending: list[tuple[str, str, asyncio.Future[None]]] = []
+        self._wake = asyncio.Event()
+        self._listener: asyncio.Task[None] | None = None
+        self._publisher: psycopg.AsyncConnection | None = None
+        self._publish_lock = asyncio.Lock()
+
+    async def start(self, handler: Handler) -> None:
+        self._handler = handler
+        self._listener = asyncio.create_task(self._listen_forever())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._publisher is not None:
+            await self._publisher.close()
+            self._publisher = None
+        for _, _, fut in self._pending:
+            if not fut.done():
+                fut.cancel()
+        self._pending.clear()
+
+    async def subscribe(self, channel: str) -> None:
+        await self._enqueue("LISTEN", channel)
+
+    async def unsubscribe(self, channel: str) -> None:
+        await self._enqueue("UNLISTEN", channel)
+
+    async def publish(self, channel: str, data: str) -> None:
+        async with self._publish_lock:
+            for attempt in range(2):
+                if self._publisher is None or self._publisher.closed:
+                    self._publisher = await psycopg.AsyncConnection.connect(
+                        self.dsn, autocommit=True
+                    )
+                try:
+                    await self._publisher.execute("SELECT pg_notify(%s, %s)", (channel, data))
+                    return
+                except psycopg.OperationalError:
+                    await self._publisher.close()
+                    self._publisher = None
+                    if attempt:
+                        raise
+
+    async def _enqueue(self, command: str, channel: str) -> None:
+        if command == "LISTEN":
+            self.channels.add(channel)
+        else:
+            self.channels.discard(channel)
+        if self._listener is None:
+            return
+        fut: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._pending.append((command, channel, fut))
+        self._wake.set()
+        await fut
+
+    async def _apply_pending(self, conn: psycopg.AsyncConnection) -> None:
+        # An entry only leaves the queue once its command went through: if the
+        # connection dies mid-way it is retried after the reconnect instead of
+        # leaving its caller waiting on a future nobody resolves.
+        while self._pending:
+            command, channel, fut = self._pending[0]
+            await conn.execute(f"{command} {sql.Identifier(channel).as_string(conn)}")
+            self._pending.pop(0)
+            if not fut.done():
+                fut.set_result(None)
+
+    async def _next_notifies(self, conn: psycopg.AsyncConnection) -> list[psycopg.Notify]:
+        """
+        Wait until notifications arrive or a command is queued, whichever comes
+        first. Waiting on an idle connection is safe to cancel: psycopg only
+        consumes input once the socket is readable.
+        """
+        self._wake.clear()
+        batch: list[psycopg.Notify] = []
+        if self._pending:
+            return batch
+
+        async def read() -> None:
+            async for notify in conn.notifies(stop_after=1):
+                batch.append(notify)
+
+        reader = asyncio.ensure_future(read())
+        waker = asyncio.ensure_future(self._wake.wait())
+        try:
+            await asyncio.wait((reader, waker), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waker.cancel()
+            reader.cancel()
+            # Let the reader unwind so it releases the connection lock.
+            await asyncio.wait((reader,))
+        if not reader.cancelled() and (exc := reader.exception()) is not None:
+            raise exc
+        return batch
+
+    async def _listen_forever(self) -> None:
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(self.dsn, autocommit=True) as conn:
+                    # A fresh connection starts with no LISTENs: replay the
+                    # current set, then resolve whatever was queued meanwhile.
+                    for channel in self.channels:
+                        await conn.execute(f"LISTEN {sql.Identifier(channel).as_string(conn)}")
+                    while True:
+                        await self._apply_pending(conn)
+                        for notify in await self._next_notifies(conn):
+                            await self._dispatch(notify.channel, notify.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("pubsub listener failed, reconnecting")
+                await asyncio.sleep(self.RECONNECT_DELAY)
+
+    async def _dispatch(self, channel: str, data: str) -> None:
+        if self._handler is None:
+            return
+        try:
+            await self._handler(channel, data)
+        except Exception:
+            log.exception("pubsub handler failed for %s", channel)
+
+
+def _psycopg_dsn(db_url: str) -> str:
+    return make_url(db_url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+def create_broker() -> Broker:
+    if settings.ws_broker == "postgres":
+        return PostgresBroker(_psycopg_dsn(settings.db_url))
+    if settings.ws_broker == "memory":
+        return InMemoryBroker()
+    raise ValueError(f"Unknown WS_BROKER: {settings.ws_broker}")
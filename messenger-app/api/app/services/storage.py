@@ -1,14 +1,54 @@
+import hashlib
 import os
+import shutil
+import time
 from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import timedelta
 from pathlib import Path
-from uuid import UUID
+from typing import BinaryIO
+from uuid import uuid4
 
 from fastapi import HTTPException, UploadFile
+from sqlalchemy import delete, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.core.metrics import counter, histogram
+from app.models import Blob
 
 UPLOAD_ROOT = Path(os.getenv("UPLOAD_ROOT", "/data/uploads"))
+BLOB_DIR = "blobs"
+VARIANT_DIR = "variants"
 
 WHITELIST = {"image/", "application/pdf", "text/plain", "application/zip"}
 MAX_BYTES = 10 * 1024 * 1024  # 10MB
+CHUNK_SIZE = 256 * 1024
+# Unreferenced blobs younger than this are kept: an upload may have written
+# the file and not yet committed the attachment that points at it.
+GC_GRACE_SECONDS = 3600
+GC_BATCH = 1000
+
+UPLOAD_SECONDS = histogram(
+    "upload_save_duration_seconds", "Time to hash and store the files of one message."
+)
+UPLOAD_BYTES = counter("upload_bytes_total", "Bytes received in uploaded files.")
+UPLOAD_FILES = counter(
+    "upload_files_total", "Uploaded files, by whether the content was already stored.", ("dedup",)
+)
+
+
+class FileTooLarge(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class SavedUpload:
+    storage_key: str
+    upload: UploadFile
+    size: int
+    sha256: str
 
 
 def validate_files(files: Iterable[UploadFile]) -> None:
@@ -18,17 +58,214 @@ def validate_files(files: Iterable[UploadFile]) -> None:
             raise HTTPException(status_code=400, detail=f"Unsupported MIME: {mt}")
 
 
-async def save_uploads(message_id: UUID, files: list[UploadFile]):
-    saved: list[tuple[str, UploadFile, int]] = []
-    base = UPLOAD_ROOT / str(message_id)
-    base.mkdir(parents=True, exist_ok=True)
-    for f in files:
-        dest = base / (f.filename or "file.bin")
-        content = await f.read()
-        size = len(content)
-        if size > MAX_BYTES:
-            raise HTTPException(status_code=400, detail=f"File too large: {f.filename}")
-        with open(dest, "wb") as out:
-            out.write(content)
-        saved.append((f"/uploads/{message_id}/{dest.name}", f, size))
+def blob_path(sha256: str) -> Path:
+    """Fan out on the first two hex pairs so no directory grows unbounded."""
+    return UPLOAD_ROOT / BLOB_DIR / sha256[:2] / sha256[2:4] / sha256
+
+
+def blob_key(sha256: str) -> str:
+    return f"/uploads/{BLOB_DIR}/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+def variant_dir(sha256: str) -> Path:
+    """Downscaled renditions derive from content, so they are stored by hash too."""
+    return UPLOAD_ROOT / VARIANT_DIR / sha256[:2] / sha256[2:4] / sha256
+
+
+def variant_key(sha256: str, name: str) -> str:
+    return f"/uploads/{VARIANT_DIR}/{sha256[:2]}/{sha256[2:4]}/{sha256}/{name}.webp"
+
+
+def key_path(storage_key: str) -> str:
+    """Path of a stored file relative to ``UPLOAD_ROOT``, from its storage key."""
+    path = storage_key.removeprefix("/uploads/")
+    if path == storage_key or ".." in Path(path).parts:
+        raise ValueError(f"Not an upload key: {storage_key}")
+    return path
+
+
+def _hash_file(src: BinaryIO, max_bytes: int = MAX_BYTES) -> tuple[int, str]:
+    """Size and SHA-256 of ``src``, read chunk by chunk. Blocking: run it in a thread."""
+    digest = hashlib.sha256()
+    size = 0
+    src.seek(0)
+    while chunk := src.read(CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_bytes:
+            raise FileTooLarge
+        digest.update(chunk)
+    return size, digest.hexdigest()
+
+
+def _write_blob(src: BinaryIO, dest: Path) -> None:
+    """
+    Copy ``src`` to ``dest`` through a temporary sibling renamed into place only
+    once complete, so readers never observe a partial blob. Two uploads racing
+    on the same content both write identical bytes; whichever rename lands last
+    wins harmlessly. Blocking: run it in a thread.
+    """
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(f".{dest.name}.{uuid4().hex}.part")
+    src.seek(0)
+    try:
+        with open(tmp, "wb") as out:
+            while chunk := src.read(CHUNK_SIZE):
+                out.write(chunk)
+        os.replace(tmp, dest)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def _store(src: BinaryIO) -> tuple[int, str, bool]:
+    """Return the size, the digest and whether the blob was already on disk."""
+    size, sha256 = _hash_file(src)
+    dest = blob_path(sha256)
+    # Content we already hold costs one read and no write. Touching it keeps
+    # the collector's grace period covering this upload as well.
+    try:
+        os.utime(dest)
+    except FileNotFoundError:
+        _write_blob(src, dest)
+        return size, sha256, False
+    return size, sha256, True
+
+
+async def save_uploads(files: list[UploadFile]) -> list[SavedUpload]:
+    """
+    Store each upload as a content-addressed blob. Nothing is removed on
+    failure: a blob may already be shared, and one nobody references is
+    reclaimed by ``collect_garbage``.
+    """
+    saved: list[SavedUpload] = []
+    with UPLOAD_SECONDS.time():
+        for f in files:
+            try:
+                size, sha256, existed = await run_in_threadpool(_store, f.file)
+            except FileTooLarge:
+                raise HTTPException(
+                    status_code=400, detail=f"File too large: {f.filename}"
+                ) from None
+            UPLOAD_BYTES.inc(size)
+            UPLOAD_FILES.inc(dedup="hit" if existed else "miss")
+            saved.append(SavedUpload(blob_key(sha256), f, size, sha256))
     return saved
+
+
+async def register_blobs(db: AsyncSession, saved: list[SavedUpload]) -> None:
+    """
+    Make sure a ``blobs`` row exists for every saved upload. Reference counts
+    are left to the triggers on ``attachments``.
+
+    The upsert keeps the rows locked until the caller commits, which is what
+    ``collect_garbage`` waits on before removing a file. A file it removed
+    between ``save_uploads`` and here is written again.
+    """
+    rows = {
+        s.sha256: {"sha256": s.sha256, "size_bytes": s.size, "storage_key": s.storage_key}
+        for s in saved
+    }
+    if not rows:
+        return
+    stmt = insert(Blob).values(list(rows.values()))
+    await db.execute(
+        stmt.on_conflict_do_update(index_elements=[Blob.sha256], set_={"created_at": func.now()})
+    )
+    uploads = {s.sha256: s.upload for s in saved}
+
+    def _restore() -> None:
+        for sha256, upload in uploads.items():
+            dest = blob_path(sha256)
+            if not dest.exists():
+                _write_blob(upload.file, dest)
+
+    await run_in_threadpool(_restore)
+
+
+def _prune(directory: Path, levels: int) -> None:
+    for parent in (directory, *directory.parents[: levels - 1]):
+        try:
+            parent.rmdir()
+        except OSError:
+            break
+
+
+def _unlink_blob(sha256: str) -> None:
+    path = blob_path(sha256)
+    path.unlink(missing_ok=True)
+    _prune(path.parent, 2)
+    variants = variant_dir(sha256)
+    shutil.rmtree(variants, ignore_errors=True)
+    _prune(variants.parent, 2)
+
+
+def _stale_files(grace: float) -> tuple[list[str], list[Path]]:
+    """Blob names and leftover ``.part`` files older than ``grace`` seconds."""
+    root = UPLOAD_ROOT / BLOB_DIR
+    if not root.is_dir():
+        return [], []
+    cutoff = time.time() - grace
+    names: list[str] = []
+    partials: list[Path] = []
+    for path in root.glob("*/*/*"):
+        try:
+            if path.stat().st_mtime >= cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        if path.name.startswith("."):
+            partials.append(path)
+        else:
+            names.append(path.name)
+    return names, partials
+
+
+async def collect_garbage(db: AsyncSession, grace: float = GC_GRACE_SECONDS) -> int:
+    """
+    Delete blobs no attachment references any more, plus files whose upload
+    never committed a row. Returns the number of blobs removed.
+
+    Files are unlinked while their rows are locked by this transaction: an
+    upload registering the same content waits for it and then writes the
+    file again, and one that registered it first is never collected.
+    """
+    names, partials = await run_in_threadpool(_stale_files, grace)
+    unreferenced = (
+        await db.scalars(
+            delete(Blob)
+            .where(
+                Blob.ref_count == 0,
+                Blob.created_at < func.now() - timedelta(seconds=grace),
+            )
+            .returning(Blob.sha256)
+        )
+    ).all()
+
+    # A file without a row gets a placeholder one, so that it is locked the
+    # same way; a conflict means an upload has registered it meanwhile.
+    orphans = sorted(set(names).difference(unreferenced))
+    claimed: list[str] = []
+    for start in range(0, len(orphans), GC_BATCH):
+        batch = orphans[start : start + GC_BATCH]
+        values = [{"sha256": n, "size_bytes": 0, "storage_key": blob_key(n)} for n in batch]
+        claimed.extend(
+            (
+                await db.scalars(
+                    insert(Blob).values(values).on_conflict_do_nothing().returning(Blob.sha256)
+                )
+            ).all()
+        )
+    for start in range(0, len(claimed), GC_BATCH):
+        await db.execute(delete(Blob).where(Blob.sha256.in_(claimed[start : start + GC_BATCH])))
+
+    removed = [*unreferenced, *claimed]
+
+    def _unlink_all() -> None:
+        for sha256 in removed:
+            _unlink_blob(sha256)
+        for path in partials:
+            path.unlink(missing_ok=True)
+
+    await run_in_threadpool(_unlink_all)
+    await db.commit()
+    return len(removed)
@@ -0,0 +1,87 @@
+import logging
+from dataclasses import dataclass
+from typing import Any
+from uuid import UUID
+
+from sqlalchemy import select, update
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.core.pool import BoundedProcessPool, PoolBusy
+from app.models import Attachment
+from app.services.imaging import ImageTooLarge, render_variants
+from app.services.storage import blob_path, variant_dir, variant_key
+
+log = logging.getLogger(__name__)
+
+RENDERABLE = {"image/png", "image/jpeg", "image/webp", "image/gif"}
+
+
+@dataclass(frozen=True)
+class RenderedVariants:
+    attachment_id: UUID
+    variants: dict[str, dict[str, Any]]
+
+
+class ThumbnailPipeline:
+    """
+    Renders image variants off the request path in a dedicated process pool.
+    Work is best effort: beyond ``max_pending`` queued images new ones are
+    skipped and keep ``variants`` NULL, and clients fall back to the original.
+    """
+
+    def __init__(self, workers: int, max_pending: int) -> None:
+        self.pool = BoundedProcessPool(workers, max_pending)
+
+    def shutdown(self) -> None:
+        self.pool.shutdown()
+
+    async def _render(self, sha256: str) -> dict[str, dict[str, Any]] | None:
+        try:
+            dims = await self.pool.run(
+                render_variants, str(blob_path(sha256)), str(variant_dir(sha256))
+            )
+        except PoolBusy:
+            log.warning("thumbnail queue full, skipping %s", sha256)
+            return None
+        except ImageTooLarge as err:
+            log.info("not rendering variants of %s: %s pixels", sha256, err)
+            return None
+        except Exception:
+            log.exception("rendering variants of %s failed", sha256)
+            return None
+        return {name: {"key": variant_key(sha256, name), **size} for name, size in dims.items()}
+
+    async def process(self, attachments: list[Attachment]) -> list[RenderedVariants]:
+        """
+        Fill ``variants`` for the renderable attachments given. Content rendered
+        for an earlier attachment is reused rather than rendered again.
+        """
+        todo = [a for a in attachments if a.sha256 and a.mime in RENDERABLE]
+        done: list[RenderedVariants] = []
+        if not todo:
+            return done
+        async with SessionLocal() as db:
+            for att in todo:
+                sha256 = att.sha256
+                assert sha256 is not None
+                variants = (
+                    await db.scalars(
+                        select(Attachment.variants)
+                        .where(Attachment.sha256 == sha256, Attachment.variants.is_not(None))
+                        .limit(1)
+                    )
+                ).first()
+                if variants is None:
+                    variants = await self._render(sha256)
+                    if variants is None:
+                        continue
+                await db.execute(
+                    update(Attachment).where(Attachment.id == att.id).values(variants=variants)
+                )
+                await db.commit()
+                done.append(RenderedVariants(att.id, variants))
+        return done
+
+
+thumbnail_pipeline = ThumbnailPipeline(settings.thumbnail_workers, settings.thumbnail_max_pending)
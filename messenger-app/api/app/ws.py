@@ -1,63 +1,493 @@
 import asyncio
+import json
+import logging
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
 from uuid import UUID
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+from sqlalchemy import or_, select
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.core.metrics import counter, gauge, histogram
+from app.deps import decode_token
+from app.models import Conversation
+from app.services.presence import Presence
+from app.services.pubsub import Broker, create_broker
+
+log = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/ws", tags=["ws"])
 
 PING_EVERY = 25
+SEND_TIMEOUT = 5.0
+ROOM_PREFIX = "room_"
+PING = json.dumps({"type": "ping"})
+# Queued in place of frames dropped on overflow: the client must refetch.
+RESYNC = json.dumps({"type": "resync"})
+# A socket asking for a conversation it is not known to belong to re-reads the
+# user's memberships (a conversation opened since it connected) at most this often.
+MEMBERSHIP_REFRESH = 5.0
+CLIENT_FRAMES = ("subscribe", "unsubscribe", "typing")
 
+FANOUT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+WS_BROADCAST = histogram(
+    "ws_broadcast_duration_seconds", "Time to encode and publish one room event."
+)
+WS_FANOUT = histogram(
+    "ws_fanout_duration_seconds",
+    "Time to enqueue one delivered event on the room's local sockets.",
+    buckets=FANOUT_BUCKETS,
+)
+WS_FANOUT_SOCKETS = histogram(
+    "ws_fanout_sockets",
+    "Local sockets an event was enqueued for.",
+    buckets=(0, 1, 2, 5, 10, 50, 100, 500),
+)
+WS_DROPPED = counter("ws_frames_dropped_total", "Frames dropped from full outbound queues.")
+WS_EVICTED = counter("ws_evictions_total", "Sockets closed for falling behind.")
 
-class WSManager:
-    def __init__(self) -> None:
-        self.rooms: dict[UUID, set[WebSocket]] = {}
 
-    async def connect(self, conv_id: UUID, ws: WebSocket) -> None:
-        await ws.accept()
-        self.rooms.setdefault(conv_id, set()).add(ws)
+def room_channel(conv_id: UUID) -> str:
+    return f"{ROOM_PREFIX}{conv_id.hex}"
+
+
+class Connection:
+    """
+    An accepted socket and its bounded outbound queue. Producers only ever
+    ``offer`` frames; a dedicated writer task drains the queue, so a slow client
+    never blocks the broadcaster and pings cannot interleave with other sends.
+
+    Frames offered with a ``key`` are coalesced: a newer frame replaces the one
+    still waiting under the same key instead of queueing behind it.
+    """
+
+    def __init__(
+        self,
+        ws: WebSocket,
+        user_id: UUID | None = None,
+        max_queue: int = settings.ws_queue_max,
+        high_water: int = settings.ws_queue_high_water,
+        policy: str = settings.ws_overflow_policy,
+        grace: float = settings.ws_slow_consumer_grace,
+    ) -> None:
+        self.ws = ws
+        self.user_id = user_id
+        # Conversations this socket is subscribed to.
+        self.rooms: set[UUID] = set()
+        self.max_queue = max_queue
+        self.high_water = high_water
+        self.policy = policy
+        self.grace = grace
+        self.dropped = 0
+        self.closed = False
+        self.close_code = status.WS_1000_NORMAL_CLOSURE
+        self._queue: deque[list[str | None]] = deque()
+        self._keyed: dict[str, list[str | None]] = {}
+        self._over_since: float | None = None
+        self._wake = asyncio.Event()
+        self._tasks: list[asyncio.Task[None]] = []
 
-    def disconnect(self, conv_id: UUID, ws: WebSocket) -> None:
-        if conv_id in self.rooms:
-            self.rooms[conv_id].discard(ws)
-            if not self.rooms[conv_id]:
-                self.rooms.pop(conv_id, None)
+    def start(self) -> None:
+        self._tasks = [
+            asyncio.create_task(self._write_loop()),
+            asyncio.create_task(self._keepalive()),
+        ]
 
-    async def broadcast_json(self, conv_id: UUID, payload: dict) -> None:
-        for ws in list(self.rooms.get(conv_id, [])):
+    async def stop(self) -> None:
+        self.closed = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def offer(self, data: str, key: str | None = None) -> None:
+        if self.closed:
+            return
+        if key is not None and key in self._keyed:
+            self._keyed[key][1] = data
+            return
+        if len(self._queue) >= self.max_queue:
+            if self.policy == "close":
+                self.evict(status.WS_1013_TRY_AGAIN_LATER)
+                return
+            # Make room for this frame and, unless one is already queued, a
+            # RESYNC ahead of it, without ever going past max_queue.
+            while self._queue and len(self._queue) + 1 + self._needs_resync(key) > self.max_queue:
+                if self._pop() != RESYNC:
+                    self.dropped += 1
+                    WS_DROPPED.inc()
+            if self._needs_resync(key):
+                self._append(RESYNC, "resync")
+                if len(self._queue) >= self.max_queue:
+                    # No room left for this frame: the RESYNC stands in for it.
+                    self.dropped += 1
+                    WS_DROPPED.inc()
+                    self._wake.set()
+                    return
+        self._append(data, key)
+        self._check_pressure()
+        self._wake.set()
+
+    def _needs_resync(self, key: str | None) -> bool:
+        return key != "resync" and "resync" not in self._keyed
+
+    def _append(self, data: str, key: str | None) -> None:
+        entry = [key, data]
+        self._queue.append(entry)
+        if key is not None:
+            self._keyed[key] = entry
+
+    def evict(self, code: int) -> None:
+        """Stop accepting frames; the writer closes the socket with ``code``."""
+        if not self.closed:
+            self.closed = True
+            self.close_code = code
+            if code == status.WS_1013_TRY_AGAIN_LATER:
+                WS_EVICTED.inc()
+            self._wake.set()
+
+    def _pop(self) -> str:
+        key, data = self._queue.popleft()
+        if key is not None:
+            self._keyed.pop(key, None)
+        assert data is not None
+        return data
+
+    def _check_pressure(self) -> None:
+        if len(self._queue) <= self.high_water:
+            self._over_since = None
+            return
+        now = time.monotonic()
+        if self._over_since is None:
+            self._over_since = now
+        elif now - self._over_since > self.grace:
+            self.evict(status.WS_1013_TRY_AGAIN_LATER)
+
+    async def _write_loop(self) -> None:
+        while not self.closed:
+            if not self._queue:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            data = self._pop()
             try:
-                await ws.send_json(payload)
+                await asyncio.wait_for(self.ws.send_text(data), SEND_TIMEOUT)
             except Exception:
-                self.disconnect(conv_id, ws)
+                self.evict(status.WS_1013_TRY_AGAIN_LATER)
+                break
+            self._check_pressure()
+        try:
+            await self.ws.close(code=self.close_code)
+        except Exception:
+            pass
+
+    async def _keepalive(self) -> None:
+        while not self.closed:
+            await asyncio.sleep(PING_EVERY)
+            self.offer(PING, key="ping")
+
+
+class WSManager:
+    """
+    Tracks the sockets held by this process, by user and by the conversations
+    (rooms) each one is subscribed to. ``broadcast_json`` goes through the
+    broker, which hands the event back to every worker subscribed to the room,
+    so a broadcast reaches sockets regardless of the process they live in.
+
+    Joining and leaving a room update these maps at once; the broker
+    (un)subscribe it may take runs in the background, started in call order.
+    """
+
+    def __init__(self, broker: Broker) -> None:
+        self.rooms: dict[UUID, set[Connection]] = {}
+        self.users: dict[UUID, set[Connection]] = {}
+        # room -> its latest broker (un)subscribe still in flight
+        self._relays: dict[UUID, asyncio.Task[None]] = {}
+        # Non-room channels (see ``listen``) and their handlers.
+        self.handlers: dict[str, Callable[[str], Awaitable[None]]] = {}
+        self.broker = broker
+        self.sockets = 0
+
+    async def start(self) -> None:
+        await self.broker.start(self._deliver)
+
+    async def stop(self) -> None:
+        await self.broker.stop()
+
+    async def listen(self, channel: str, handler: Callable[[str], Awaitable[None]]) -> None:
+        """Hand every message published on ``channel``, by any worker, to ``handler``."""
+        self.handlers[channel] = handler
+        await self.broker.subscribe(channel)
+
+    async def connect(self, user_id: UUID, ws: WebSocket) -> Connection:
+        await ws.accept()
+        conn = Connection(ws, user_id)
+        conn.start()
+        self.users.setdefault(user_id, set()).add(conn)
+        self.sockets += 1
+        return conn
+
+    async def disconnect(self, conn: Connection) -> None:
+        await conn.stop()
+        assert conn.user_id is not None
+        connections = self.users.get(conn.user_id)
+        if connections is None or conn not in connections:
+            return
+        connections.discard(conn)
+        self.sockets -= 1
+        if not connections:
+            self.users.pop(conn.user_id, None)
+        for conv_id in list(conn.rooms):
+            self.unsubscribe(conn, conv_id)
+
+    def subscribe(self, conn: Connection, conv_id: UUID) -> asyncio.Future[None]:
+        """
+        Deliver the room's events to ``conn``; membership is the caller's check.
+        The returned future resolves once the broker relays the room to this
+        worker, so the caller does not have to wait for it.
+        """
+        if conv_id not in conn.rooms:
+            conn.rooms.add(conv_id)
+            room = self.rooms.setdefault(conv_id, set())
+            if not room:
+                self._relay(conv_id, self.broker.subscribe)
+            room.add(conn)
+        relay = self._relays.get(conv_id)
+        if relay is not None:
+            return relay
+        ready = asyncio.get_running_loop().create_future()
+        ready.set_result(None)
+        return ready
+
+    def unsubscribe(self, conn: Connection, conv_id: UUID) -> None:
+        conn.rooms.discard(conv_id)
+        room = self.rooms.get(conv_id)
+        if room is None or conn not in room:
+            return
+        room.discard(conn)
+        if not room:
+            self.rooms.pop(conv_id, None)
+            self._relay(conv_id, self.broker.unsubscribe)
+
+    def _relay(self, conv_id: UUID, command: Callable[[str], Awaitable[None]]) -> None:
+        task = asyncio.ensure_future(command(room_channel(conv_id)))
+        self._relays[conv_id] = task
+
+        def done(_: asyncio.Task[None]) -> None:
+            if self._relays.get(conv_id) is task:
+                del self._relays[conv_id]
+            if not task.cancelled() and task.exception() is not None:
+                log.error("broker failed for room %s", conv_id, exc_info=task.exception())
 
+        task.add_done_callback(done)
 
-manager = WSManager()
+    async def broadcast_json(
+        self, conv_id: UUID, payload: dict, fallback: dict | None = None
+    ) -> None:
+        """
+        Encode ``payload`` once and publish it to the room. ``fallback`` is sent
+        instead when the encoded payload exceeds what the broker can carry.
+        Both are stamped with ``conversation_id``: a socket carries many rooms.
+        """
+        with WS_BROADCAST.time():
+            room = {"conversation_id": str(conv_id)}
+            data = json.dumps({**room, **payload}, separators=(",", ":"))
+            limit = self.broker.max_payload
+            if fallback is not None and limit is not None and len(data.encode()) > limit:
+                data = json.dumps({**room, **fallback}, separators=(",", ":"))
+            await self.broker.publish(room_channel(conv_id), data)
 
+    async def _deliver(self, channel: str, data: str) -> None:
+        if not channel.startswith(ROOM_PREFIX):
+            handler = self.handlers.get(channel)
+            if handler is not None:
+                await handler(data)
+            return
+        conv_id = UUID(hex=channel[len(ROOM_PREFIX) :])
+        room = self.rooms.get(conv_id, ())
+        start = time.perf_counter()
+        # Enqueue only: every connection's writer sends at its own pace.
+        for conn in room:
+            conn.offer(data)
+        WS_FANOUT.observe(time.perf_counter() - start)
+        WS_FANOUT_SOCKETS.observe(len(room))
 
-async def _keepalive(ws: WebSocket):
+
+manager = WSManager(create_broker())
+presence = Presence(manager)
+gauge("ws_rooms", "Rooms with at least one socket in this process.", fn=lambda: len(manager.rooms))
+gauge("ws_sockets", "Open sockets in this process.", fn=lambda: manager.sockets)
+gauge("ws_users", "Users with at least one socket in this process.", fn=lambda: len(manager.users))
+gauge("presence_online_users", "Users online on any worker.", fn=lambda: len(presence.claims))
+
+
+class Membership:
+    """
+    The conversations a socket's user belongs to, with the peer of each, read
+    once at connect. An id missing from them triggers a re-read, at most every
+    MEMBERSHIP_REFRESH seconds, so a socket cannot turn its frames into a
+    query each.
+    """
+
+    def __init__(self, user_id: UUID) -> None:
+        self.user_id = user_id
+        self.peers: dict[UUID, UUID] = {}
+        self.loaded_at = float("-inf")
+
+    async def load(self) -> None:
+        async with SessionLocal() as db:
+            rows = await db.execute(
+                select(Conversation.id, Conversation.user_a_id, Conversation.user_b_id).where(
+                    or_(
+                        Conversation.user_a_id == self.user_id,
+                        Conversation.user_b_id == self.user_id,
+                    )
+                )
+            )
+            self.peers = {conv_id: b if a == self.user_id else a for conv_id, a, b in rows.tuples()}
+        self.loaded_at = time.monotonic()
+
+    async def allows(self, conv_id: UUID) -> bool:
+        if conv_id not in self.peers and time.monotonic() - self.loaded_at >= MEMBERSHIP_REFRESH:
+            await self.load()
+        return conv_id in self.peers
+
+
+def _reply(kind: str, conv_id: UUID | None = None, detail: str | None = None) -> str:
+    frame: dict[str, str] = {"type": kind}
+    if conv_id is not None:
+        frame["conversation_id"] = str(conv_id)
+    if detail is not None:
+        frame["detail"] = detail
+    return json.dumps(frame)
+
+
+def _subscribe(conn: Connection, membership: Membership, conv_id: UUID, ack: bool = True) -> None:
+    """
+    Join the room without holding up the socket's read loop: the ack and the
+    peer's presence follow once the broker relays the room, unless the socket
+    left it (or closed) meanwhile.
+    """
+
+    def joined(ready: asyncio.Future[None]) -> None:
+        if ready.cancelled() or ready.exception() is not None:
+            manager.unsubscribe(conn, conv_id)
+            conn.offer(_reply("error", conv_id, "Subscribe failed"))
+            return
+        if conn.closed or conv_id not in conn.rooms:
+            return
+        if ack:
+            conn.offer(_reply("subscribed", conv_id))
+        presence.watch(conn, membership.peers[conv_id])
+
+    manager.subscribe(conn, conv_id).add_done_callback(joined)
+
+
+def _unwatch(conn: Connection, membership: Membership, conv_id: UUID) -> None:
+    peer_id = membership.peers.get(conv_id)
+    if peer_id is not None and conv_id in conn.rooms:
+        presence.unwatch(conn, peer_id)
+
+
+async def _unsubscribe(conn: Connection, membership: Membership, conv_id: UUID) -> None:
+    _unwatch(conn, membership, conv_id)
+    manager.unsubscribe(conn, conv_id)
+    await _stop_typing(conn, conv_id)
+
+
+async def _stop_typing(conn: Connection, conv_id: UUID) -> None:
+    """``conn`` left ``conv_id``: clear its user's typing unless another socket stays."""
+    assert conn.user_id is not None
+    if not any(conv_id in other.rooms for other in manager.users.get(conn.user_id, ())):
+        await presence.stop_typing(conv_id, conn.user_id)
+
+
+async def _disconnect(conn: Connection, membership: Membership) -> None:
+    """The socket closed: leave its rooms, then settle its user's presence and typing."""
+    assert conn.user_id is not None
+    rooms = list(conn.rooms)
+    for conv_id in rooms:
+        _unwatch(conn, membership, conv_id)
+    await manager.disconnect(conn)
+    presence.disconnected(conn.user_id)
+    for conv_id in rooms:
+        await _stop_typing(conn, conv_id)
+
+
+async def _handle_frame(conn: Connection, membership: Membership, text: str) -> None:
+    """
+    Apply one client frame: ``subscribe`` / ``unsubscribe`` / ``typing``,
+    anything else is ignored.
+    """
     try:
-        while True:
-            await asyncio.sleep(PING_EVERY)
-            await ws.send_json({"type": "ping"})
-    except Exception:
-        pass
+        frame = json.loads(text)
+    except ValueError:
+        return
+    if not isinstance(frame, dict) or frame.get("type") not in CLIENT_FRAMES:
+        return  # pongs and unknown frames
+    try:
+        conv_id = UUID(str(frame.get("conversation_id")))
+    except ValueError:
+        conn.offer(_reply("error", detail="Bad conversation_id"))
+        return
+
+    if frame["type"] == "typing":
+        if conv_id not in conn.rooms:
+            conn.offer(_reply("error", conv_id, "Not subscribed"))
+            return
+        assert conn.user_id is not None
+        await presence.typing(conv_id, conn.user_id, frame.get("typing") is not False)
+    elif frame["type"] == "unsubscribe":
+        await _unsubscribe(conn, membership, conv_id)
+        conn.offer(_reply("unsubscribed", conv_id))
+    elif conv_id not in conn.rooms and len(conn.rooms) >= settings.ws_max_subscriptions:
+        conn.offer(_reply("error", conv_id, "Too many subscriptions"))
+    elif not await membership.allows(conv_id):
+        conn.offer(_reply("error", conv_id, "Conversation not found"))
+    else:
+        _subscribe(conn, membership, conv_id)
 
 
 @router.websocket("")
 async def ws_endpoint(websocket: WebSocket):
+    """
+    One socket per user session, authenticated by ``?token=``. Conversations
+    are joined and left with ``subscribe`` / ``unsubscribe`` frames;
+    ``?conversation_id=`` subscribes to one right away, as older clients expect.
+    A subscription also follows the peer's presence; ``typing`` frames go to the
+    conversation through ``presence``.
+    """
     token = websocket.query_params.get("token")
-    conv_id_str = websocket.query_params.get("conversation_id")
-    if not token or not conv_id_str:
+    try:
+        user_id = decode_token(token) if token else None
+    except HTTPException:
+        user_id = None
+    if user_id is None:
         await websocket.close(code=4401)
         return
-    conv_id = UUID(conv_id_str)
 
-    await manager.connect(conv_id, websocket)
-    keep_task = asyncio.create_task(_keepalive(websocket))
+    membership = Membership(user_id)
+    await membership.load()
+    initial = None
+    if conv_id_str := websocket.query_params.get("conversation_id"):
+        try:
+            initial = UUID(conv_id_str)
+        except ValueError:
+            pass
+        if initial is None or initial not in membership.peers:
+            await websocket.close(code=4403)
+            return
+
+    conn = await manager.connect(user_id, websocket)
     try:
+        await presence.connected(user_id)
+        if initial is not None:
+            _subscribe(conn, membership, initial, ack=False)
         while True:
-            _ = await websocket.receive_text()
-    except WebSocketDisconnect:
+            await _handle_frame(conn, membership, await websocket.receive_text())
+    except (WebSocketDisconnect, RuntimeError):
         pass
     finally:
-        keep_task.cancel()
-        manager.disconnect(conv_id, websocket)
+        await _disconnect(conn, membership)
@@ -0,0 +1,260 @@
+"""
+Load generator for the messaging hot paths, run against a live API (for
+example the docker-compose stack) from the ``api`` directory:
+
+    pip install -e ".[bench]"
+    python -m bench.load --url http://localhost:8000 --pairs 20 --sockets 200 --duration 30
+
+It registers ``2 * pairs`` fresh users, opens one conversation per pair and
+seeds some history, connects ``--sockets`` WebSockets spread over those
+conversations, then runs ``--concurrency`` workers for ``--duration`` seconds,
+each repeatedly sending a text message, sending a message with an attachment,
+or paging back through history.
+
+Broadcast lag is measured from the start of the POST that created a message to
+its ``message:new`` frame arriving on each socket of the conversation.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+from uuid import uuid4
+
+import httpx
+from websockets.asyncio.client import ClientConnection, connect
+
+from bench.report import Series, emit
+
+TAG = "bench:"
+
+
+@dataclass
+class Pair:
+    conversation_id: str
+    headers: tuple[dict[str, str], dict[str, str]]
+    tokens: tuple[str, str]
+
+
+@dataclass
+class Run:
+    args: argparse.Namespace
+    client: httpx.AsyncClient
+    series: dict[str, Series] = field(default_factory=dict)
+    # Message tag -> perf_counter() when its POST started.
+    sent_at: dict[str, float] = field(default_factory=dict)
+    deliveries: int = 0
+
+    def series_for(self, name: str) -> Series:
+        return self.series.setdefault(name, Series(name))
+
+    async def timed(self, name: str, method: str, url: str, **kwargs: Any) -> httpx.Response | None:
+        series = self.series_for(name)
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            series.errors += 1
+            return None
+        if response.is_error:
+            series.errors += 1
+            return None
+        series.add(time.perf_counter() - start)
+        return response
+
+
+async def _register(run: Run, prefix: str, index: int) -> tuple[str, str]:
+    name = f"{prefix}{index}"
+    body = {"email": f"{name}@bench.example.com", "username": name, "password": "bench-password"}
+    response = await run.timed("register", "POST", "/auth/register", json=body)
+    if response is None:
+        raise RuntimeError(f"could not register {name}")
+    token = response.json()["access_token"]
+    me = await run.client.get("/users/me", headers={"Authorization": f"Bearer {token}"})
+    me.raise_for_status()
+    return token, me.json()["id"]
+
+
+async def _open_pair(run: Run, a: tuple[str, str], b: tuple[str, str]) -> Pair:
+    headers = ({"Authorization": f"Bearer {a[0]}"}, {"Authorization": f"Bearer {b[0]}"})
+    response = await run.timed(
+        "open_conversation", "POST", "/conversations", json={"peer_id": b[1]}, headers=headers[0]
+    )
+    if response is None:
+        raise RuntimeError("could not open a conversation")
+    pair = Pair(response.json()["id"], headers, (a[0], b[0]))
+    for i in range(run.args.seed):
+        await run.client.post(
+            f"/conversations/{pair.conversation_id}/messages",
+            data={"content": f"seed {i}"},
+            headers=headers[i % 2],
+        )
+    return pair
+
+
+async def setup(run: Run) -> list[Pair]:
+    prefix = f"bench{uuid4().hex[:8]}u"
+    gate = asyncio.Semaphore(run.args.concurrency)
+
+    async def register(index: int) -> tuple[str, str]:
+        async with gate:
+            return await _register(run, prefix, index)
+
+    users = await asyncio.gather(*(register(i) for i in range(2 * run.args.pairs)))
+
+    async def open_pair(index: int) -> Pair:
+        async with gate:
+            return await _open_pair(run, users[2 * index], users[2 * index + 1])
+
+    return list(await asyncio.gather(*(open_pair(i) for i in range(run.args.pairs))))
+
+
+async def _listen(run: Run, socket: ClientConnection) -> None:
+    lag = run.series_for("broadcast_lag")
+    async for frame in socket:
+        arrived = time.perf_counter()
+        event = json.loads(frame)
+        if event.get("type") != "message:new":
+            continue
+        content = (event.get("message") or {}).get("content") or ""
+        started = run.sent_at.get(content)
+        if started is not None:
+            lag.add(arrived - started)
+            run.deliveries += 1
+
+
+async def open_sockets(run: Run, pairs: list[Pair]) -> list[asyncio.Task[None]]:
+    async def hold(pair: Pair, side: int) -> None:
+        url = f"{run.args.ws_url}?token={pair.tokens[side]}&conversation_id={pair.conversation_id}"
+        start = time.perf_counter()
+        try:
+            async with connect(url, max_queue=None, open_timeout=30) as socket:
+                run.series_for("ws_connect").add(time.perf_counter() - start)
+                await _listen(run, socket)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            run.series_for("ws_connect").errors += 1
+
+    tasks = []
+    for i in range(run.args.sockets):
+        pair = pairs[i % len(pairs)]
+        tasks.append(asyncio.create_task(hold(pair, (i // len(pairs)) % 2)))
+        if i % 50 == 49:
+            await asyncio.sleep(0)  # let the handshakes progress in batches
+    await asyncio.sleep(run.args.settle)
+    return tasks
+
+
+async def _send(run: Run, pair: Pair, with_file: bool) -> None:
+    side = random.randrange(2)
+    tag = f"{TAG}{uuid4().hex}"
+    files = None
+    if with_file:
+        payload = os.urandom(run.args.attachment_bytes)
+        files = [("files", ("bench.pdf", payload, "application/pdf"))]
+    run.sent_at[tag] = time.perf_counter()
+    await run.timed(
+        "send_attachment" if with_file else "send_text",
+        "POST",
+        f"/conversations/{pair.conversation_id}/messages",
+        data={"content": tag},
+        files=files,
+        headers=pair.headers[side],
+    )
+
+
+async def _page_history(run: Run, pair: Pair) -> None:
+    cursor = None
+    for _ in range(run.args.pages):
+        params: dict[str, Any] = {"limit": run.args.page_size}
+        if cursor:
+            params["cursor"] = cursor
+        response = await run.timed(
+            "history_page",
+            "GET",
+            f"/conversations/{pair.conversation_id}/messages",
+            params=params,
+            headers=pair.headers[0],
+        )
+        if response is None:
+            return
+        cursor = response.json().get("next_cursor")
+        if not cursor:
+            return
+
+
+async def worker(run: Run, pairs: list[Pair], deadline: float) -> None:
+    args = run.args
+    while time.perf_counter() < deadline:
+        pair = random.choice(pairs)
+        roll = random.random()
+        if roll < args.attachment_ratio:
+            await _send(run, pair, with_file=True)
+        elif roll < args.attachment_ratio + args.history_ratio:
+            await _page_history(run, pair)
+        else:
+            await _send(run, pair, with_file=False)
+
+
+async def main(args: argparse.Namespace) -> None:
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+        run = Run(args, client)
+        pairs = await setup(run)
+        sockets = await open_sockets(run, pairs) if args.sockets else []
+
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(worker(run, pairs, deadline) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(args.settle)  # frames still in flight
+
+        for task in sockets:
+            task.cancel()
+        await asyncio.gather(*sockets, return_exceptions=True)
+
+    measured = ("send_text", "send_attachment", "history_page", "broadcast_lag")
+    results = {
+        name: series.summary(elapsed if name in measured else None)
+        for name, series in run.series.items()
+    }
+    sent = run.series_for("send_text").samples + run.series_for("send_attachment").samples
+    notes = [
+        f"{args.pairs} conversations, {args.sockets} sockets, {args.concurrency} workers, "
+        f"{elapsed:.1f}s measured",
+        f"{len(sent) / elapsed:.1f} messages/s, {run.deliveries} socket deliveries",
+    ]
+    emit(results, save=args.json, baseline=args.baseline, notes=notes)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m bench.load")
+    parser.add_argument("--url", default="http://localhost:8000", help="API base URL")
+    parser.add_argument("--ws-url", help="WebSocket endpoint (default: <url>/ws)")
+    parser.add_argument("--pairs", type=int, default=20, help="conversations to create")
+    parser.add_argument("--sockets", type=int, default=100, help="WebSockets to hold open")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load")
+    parser.add_argument("--seed", type=int, default=60, help="messages per conversation upfront")
+    parser.add_argument("--attachment-ratio", type=float, default=0.1)
+    parser.add_argument("--attachment-bytes", type=int, default=64 * 1024)
+    parser.add_argument("--history-ratio", type=float, default=0.3)
+    parser.add_argument("--pages", type=int, default=3, help="pages fetched per history walk")
+    parser.add_argument("--page-size", type=int, default=30)
+    parser.add_argument("--settle", type=float, default=1.0, help="seconds to wait for sockets")
+    parser.add_argument("--json", type=Path, help="write the results here")
+    parser.add_argument("--baseline", type=Path, help="compare with an earlier --json file")
+    args = parser.parse_args(argv)
+    if args.ws_url is None:
+        args.ws_url = args.url.replace("http", "ws", 1).rstrip("/") + "/ws"
+    return args
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,148 @@
+"""
+In-process microbenchmarks, no database or server needed. From the ``api``
+directory:
+
+    python -m bench.micro [--iterations 2000] [--json out.json] [--baseline before.json]
+
+* ``message_page_validate`` / ``message_page_dump``: one history page (``--page-size``
+  messages, every fifth with two attachments) validated into ``MessageOut`` and
+  rendered as JSON, the two halves of ``GET .../messages``.
+* ``message_event_dump``: one ``MessageOut`` dumped for a ``message:new`` event.
+* ``broadcast_json_<n>``: ``WSManager.broadcast_json`` through the in-memory broker
+  into a room of ``n`` local sockets (encode, publish, enqueue on each socket).
+"""
+
+import argparse
+import asyncio
+import time
+from collections.abc import Callable
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import Any
+from uuid import uuid4
+
+from app.routers.messages import MESSAGE_LIST
+from app.schemas.message import MessagePage
+from app.schemas.user import UserOut
+from app.services.pubsub import InMemoryBroker
+from app.ws import Connection, WSManager, room_channel
+from bench.report import Series, emit
+
+
+def _rows(count: int) -> list[dict[str, Any]]:
+    now = datetime.now(UTC)
+    conversation_id = uuid4()
+    senders = [
+        UserOut(id=uuid4(), email=f"user{i}@example.com", username=f"user{i}", created_at=now)
+        for i in range(2)
+    ]
+    rows = []
+    for i in range(count):
+        message_id = uuid4()
+        attachments = [
+            {
+                "id": uuid4(),
+                "message_id": message_id,
+                "filename": f"photo{j}.jpg",
+                "mime": "image/jpeg",
+                "size_bytes": 123_456,
+                "storage_key": f"/uploads/blobs/ab/cd/{uuid4().hex}",
+                "variants": {
+                    "thumb": {"key": "/uploads/variants/t.webp", "width": 320, "height": 240}
+                },
+                "created_at": now,
+            }
+            for j in range(2 if i % 5 == 0 else 0)
+        ]
+        sender = senders[i % 2]
+        rows.append(
+            {
+                "id": message_id,
+                "conversation_id": conversation_id,
+                "sender_id": sender.id,
+                "sender": sender,
+                "content": f"message number {i} " * 4,
+                "created_at": now - timedelta(seconds=i),
+                "edited_at": None,
+                "deleted_at": None,
+                "seq": count - i,
+                "attachments": attachments,
+            }
+        )
+    return rows
+
+
+def _measure(name: str, fn: Callable[[], Any], iterations: int) -> Series:
+    series = Series(name)
+    for _ in range(max(1, iterations // 20)):
+        fn()  # warm-up
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        series.add(time.perf_counter() - start)
+    return series
+
+
+async def _measure_broadcast(sockets: int, payload: dict[str, Any], iterations: int) -> Series:
+    manager = WSManager(InMemoryBroker())
+    await manager.start()
+    conv_id = uuid4()
+    # Never started: frames are only queued, which is all the broadcaster does.
+    manager.rooms[conv_id] = {
+        Connection(None, max_queue=iterations + 1, high_water=iterations + 1)  # type: ignore[arg-type]
+        for _ in range(sockets)
+    }
+    await manager.broker.subscribe(room_channel(conv_id))
+
+    series = Series(f"broadcast_json_{sockets}")
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await manager.broadcast_json(conv_id, payload)
+        series.add(time.perf_counter() - start)
+    await manager.stop()
+    return series
+
+
+def main(args: argparse.Namespace) -> None:
+    rows = _rows(args.page_size)
+    items = MESSAGE_LIST.validate_python(rows)
+    page = MessagePage.model_construct(items=items, next_cursor="cursor")
+    message = items[0]
+    event = {
+        "type": "message:new",
+        "message_id": str(message.id),
+        "message": message.model_dump(mode="json"),
+    }
+
+    n = args.iterations
+    measured = [
+        _measure("message_page_validate", lambda: MESSAGE_LIST.validate_python(rows), n),
+        _measure("message_page_dump", lambda: page.model_dump_json().encode(), n),
+        _measure("message_event_dump", lambda: message.model_dump(mode="json"), n),
+    ]
+    for sockets in args.sockets:
+        measured.append(asyncio.run(_measure_broadcast(sockets, event, n)))
+
+    results = {s.name: s.summary(sum(s.samples)) for s in measured}
+    emit(
+        results,
+        save=args.json,
+        baseline=args.baseline,
+        notes=[f"{n} iterations, page of {args.page_size} messages"],
+    )
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m bench.micro")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument(
+        "--sockets", type=int, nargs="+", default=[1, 10, 100], help="room sizes for broadcast_json"
+    )
+    parser.add_argument("--json", type=Path, help="write the results here")
+    parser.add_argument("--baseline", type=Path, help="compare with an earlier --json file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,92 @@
+"""
+Latency samples and the table both benchmarks print. Results can be saved as
+JSON (``--json``) and compared with an earlier run (``--baseline``).
+"""
+
+import json
+import sys
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+@dataclass
+class Series:
+    """Durations in seconds for one operation, plus how many attempts failed."""
+
+    name: str
+    samples: list[float] = field(default_factory=list)
+    errors: int = 0
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def summary(self, elapsed: float | None = None) -> dict[str, Any]:
+        values = sorted(self.samples)
+        row: dict[str, Any] = {
+            "count": len(values),
+            "errors": self.errors,
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+            "max_ms": (values[-1] if values else 0.0) * 1000,
+        }
+        if elapsed:
+            row["per_sec"] = len(values) / elapsed
+        return row
+
+
+COLUMNS = ("count", "errors", "per_sec", "p50_ms", "p95_ms", "p99_ms", "max_ms")
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.3f}" if value < 10 else f"{value:.1f}"
+    return str(value)
+
+
+def render(results: dict[str, dict[str, Any]], baseline: dict[str, dict[str, Any]] | None) -> str:
+    header = ["name", *COLUMNS]
+    if baseline is not None:
+        header.append("p50 vs base")
+    rows = [header]
+    for name, row in results.items():
+        cells = [name, *(_cell(row.get(col)) for col in COLUMNS)]
+        if baseline is not None:
+            before = baseline.get(name, {}).get("p50_ms")
+            cells.append(f"{(row['p50_ms'] / before - 1) * 100:+.1f}%" if before else "-")
+        rows.append(cells)
+    widths = [max(len(r[i]) for r in rows) for i in range(len(header))]
+    lines = (
+        "  ".join(
+            c.ljust(w) if i == 0 else c.rjust(w)
+            for i, (c, w) in enumerate(zip(r, widths, strict=True))
+        )
+        for r in rows
+    )
+    return "\n".join(lines) + "\n"
+
+
+def emit(
+    results: dict[str, dict[str, Any]],
+    save: Path | None = None,
+    baseline: Path | None = None,
+    notes: Iterable[str] = (),
+) -> None:
+    previous = json.loads(baseline.read_text()) if baseline is not None else None
+    for note in notes:
+        sys.stdout.write(f"{note}\n")
+    sys.stdout.write(render(results, previous))
+    if save is not None:
+        save.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
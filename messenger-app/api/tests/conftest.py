@@ -0,0 +1,128 @@
+"""
+Tests that use ``client`` run the app in-process against the database named by
+``DATABASE_URL``, migrated to head once per session. The others need no database.
+"""
+
+import json
+import os
+import tempfile
+import uuid
+from collections.abc import AsyncIterator, Callable, Iterator
+from contextlib import AbstractContextManager, contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+os.environ.setdefault("UPLOAD_ROOT", tempfile.mkdtemp(prefix="uploads-"))
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+from alembic.config import Config  # noqa: E402
+
+from alembic import command  # type: ignore  # noqa: E402
+from app import ws  # noqa: E402
+from app.core.db import engine  # noqa: E402
+from app.core.queries import BUDGET_ATTR, QueryCounter, count_queries  # noqa: E402
+from app.deps import recent_writers, token_cache, user_cache  # noqa: E402
+from app.main import app  # noqa: E402
+from app.routers.users import search_cache  # noqa: E402
+
+API_ROOT = Path(__file__).resolve().parents[1]
+
+
+@dataclass
+class Account:
+    id: uuid.UUID
+    username: str
+    headers: dict[str, str]
+
+
+class FakeSocket:
+    """Server side of a WebSocket, recording the frames the app sends."""
+
+    def __init__(self) -> None:
+        self.sent: list[dict[str, Any]] = []
+        self.close_code: int | None = None
+
+    async def accept(self) -> None:
+        pass
+
+    async def send_text(self, data: str) -> None:
+        self.sent.append(json.loads(data))
+
+    async def close(self, code: int = 1000) -> None:
+        self.close_code = code
+
+
+@pytest.fixture(scope="session")
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+def migrated() -> None:
+    config = Config(str(API_ROOT / "alembic.ini"))
+    config.set_main_option("script_location", str(API_ROOT / "alembic"))
+    command.upgrade(config, "head")
+
+
+@pytest.fixture
+async def client(migrated: None) -> AsyncIterator[httpx.AsyncClient]:
+    await ws.manager.start()
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+            yield c
+    finally:
+        await ws.manager.stop()
+        # Pooled connections belong to this test's event loop.
+        await engine.dispose()
+
+
+@pytest.fixture
+def fake_socket() -> type[FakeSocket]:
+    return FakeSocket
+
+
+@pytest.fixture
+def make_user(client: httpx.AsyncClient) -> Callable[[str], Any]:
+    async def make(name: str) -> Account:
+        username = f"{name}_{uuid.uuid4().hex[:8]}"
+        r = await client.post(
+            "/auth/register",
+            json={"email": f"{username}@example.com", "username": username, "password": "pw"},
+        )
+        assert r.status_code == 201, r.text
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+        me = await client.get("/users/me", headers=headers)
+        return Account(uuid.UUID(me.json()["id"]), username, headers)
+
+    return make
+
+
+def _clear_caches() -> None:
+    for cache in (token_cache, user_cache, recent_writers, search_cache):
+        cache.clear()
+
+
+@pytest.fixture
+def budget() -> Callable[[Callable[..., Any]], AbstractContextManager[QueryCounter]]:
+    """
+    ``with budget(endpoint): ...`` fails the test when the block runs more SQL
+    statements than ``endpoint`` declares with ``@query_budget``. Caches are
+    emptied first, so the block pays for the user lookup like a cold worker.
+    """
+
+    @contextmanager
+    def check(endpoint: Callable[..., Any]) -> Iterator[QueryCounter]:
+        limit = getattr(endpoint, BUDGET_ATTR)
+        _clear_caches()
+        with count_queries() as counter:
+            yield counter
+        statements = "\n".join(counter.statements)
+        assert counter.count <= limit, (
+            f"{endpoint.__name__} ran {counter.count} queries, budget is {limit}:\n{statements}"
+        )
+
+    return check
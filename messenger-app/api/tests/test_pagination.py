@@ -0,0 +1,59 @@
+"""Opaque keyset cursors for message history."""
+
+import base64
+import uuid
+from datetime import UTC, datetime
+
+import pytest
+
+from app.core.pagination import decode_cursor, encode_cursor
+
+
+def raw_cursor(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2025, 3, 1, 12, 30, 45, 123456, tzinfo=UTC)
+    id_ = uuid.uuid4()
+    cursor = encode_cursor(created_at, id_)
+    assert cursor.replace("-", "").replace("_", "").isalnum()
+    assert decode_cursor(cursor) == (created_at, id_)
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not base64!",
+        raw_cursor(b"\xff\xfe"),
+        raw_cursor(b"2025-03-01T12:30:45+00:00"),
+        raw_cursor(f"2025-03-01T12:30:45|{uuid.uuid4()}".encode()),
+        raw_cursor(f"yesterday|{uuid.uuid4()}".encode()),
+        raw_cursor(b"2025-03-01T12:30:45+00:00|not-a-uuid"),
+    ],
+    ids=["base64", "utf8", "separator", "naive", "timestamp", "uuid"],
+)
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+@pytest.mark.anyio
+async def test_history_pages_by_cursor(client, make_user):
+    alice, bob = await make_user("alice"), await make_user("bob")
+    r = await client.post("/conversations", json={"peer_id": str(bob.id)}, headers=alice.headers)
+    url = f"/conversations/{r.json()['id']}/messages"
+    for text in ("one", "two", "three"):
+        await client.post(url, data={"content": text}, headers=alice.headers)
+
+    first = (await client.get(url, params={"limit": 2}, headers=alice.headers)).json()
+    rest = await client.get(
+        url, params={"limit": 2, "cursor": first["next_cursor"]}, headers=alice.headers
+    )
+    assert [m["content"] for m in first["items"]] == ["three", "two"]
+    assert [m["content"] for m in rest.json()["items"]] == ["one"]
+    assert rest.json()["next_cursor"] is None
+
+    bad = await client.get(url, params={"cursor": "not base64!"}, headers=alice.headers)
+    assert bad.status_code == 400
+    assert bad.json()["detail"] == "Bad cursor format"
@@ -0,0 +1,115 @@
+"""Typing indicators: the per-typist throttle and clearing them when the typist leaves."""
+
+import asyncio
+import json
+import time
+import uuid
+
+import pytest
+
+from app import ws
+from app.services.presence import Presence
+from app.services.pubsub import InMemoryBroker
+
+pytestmark = pytest.mark.anyio
+
+INTERVAL = 0.05
+
+
+@pytest.fixture
+async def presence(monkeypatch):
+    manager = ws.WSManager(InMemoryBroker())
+    presence = Presence(manager, grace=0, typing_interval=INTERVAL)
+    monkeypatch.setattr(ws, "manager", manager)
+    monkeypatch.setattr(ws, "presence", presence)
+    await manager.start()
+    yield presence
+    await presence.stop()
+    await manager.stop()
+
+
+@pytest.fixture
+def join(presence, fake_socket):
+    """Open a socket for ``user_id`` subscribed to ``conv_id``, whose other member is ``peer_id``."""
+
+    async def open_socket(user_id, conv_id, peer_id):
+        conn = await presence.manager.connect(user_id, fake_socket())
+        membership = ws.Membership(user_id)
+        membership.peers = {conv_id: peer_id}
+        membership.loaded_at = time.monotonic()
+        await send(conn, membership, "subscribe", conv_id)
+        await asyncio.sleep(0)
+        return conn, membership
+
+    return open_socket
+
+
+async def send(conn, membership, kind, conv_id, **fields):
+    frame = {"type": kind, "conversation_id": str(conv_id), **fields}
+    await ws._handle_frame(conn, membership, json.dumps(frame))
+
+
+def typing_seen(conn):
+    return [frame["typing"] for frame in conn.ws.sent if frame["type"] == "typing"]
+
+
+@pytest.fixture
+def ids():
+    return uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+
+
+async def test_repeated_typing_frames_are_throttled(presence, join, ids):
+    conv_id, alice, bob = ids
+    typist, membership = await join(alice, conv_id, bob)
+    watcher, _ = await join(bob, conv_id, alice)
+
+    for _ in range(10):
+        await send(typist, membership, "typing", conv_id)
+    await send(typist, membership, "typing", conv_id, typing=False)
+    await asyncio.sleep(INTERVAL / 2)
+    assert typing_seen(watcher) == [True]
+
+    await asyncio.sleep(INTERVAL * 3)
+    assert typing_seen(watcher) == [True, False]
+    assert not presence._typing
+
+
+async def test_typist_who_disconnects_is_shown_as_stopped(presence, join, ids):
+    conv_id, alice, bob = ids
+    typist, membership = await join(alice, conv_id, bob)
+    watcher, _ = await join(bob, conv_id, alice)
+
+    await send(typist, membership, "typing", conv_id)
+    # Past the window: nothing is pending, peers were just told "typing".
+    await asyncio.sleep(INTERVAL * 2)
+    await ws._disconnect(typist, membership)
+    await asyncio.sleep(INTERVAL / 2)
+    assert typing_seen(watcher) == [True, False]
+    assert not presence._shown
+
+
+async def test_typing_is_kept_while_another_socket_stays(presence, join, ids):
+    conv_id, alice, bob = ids
+    typist, membership = await join(alice, conv_id, bob)
+    other_tab, other_membership = await join(alice, conv_id, bob)
+    watcher, _ = await join(bob, conv_id, alice)
+
+    await send(typist, membership, "typing", conv_id)
+    await asyncio.sleep(INTERVAL * 2)
+    await ws._disconnect(typist, membership)
+    await asyncio.sleep(INTERVAL / 2)
+    assert typing_seen(watcher) == [True]
+
+    await send(other_tab, other_membership, "unsubscribe", conv_id)
+    await asyncio.sleep(INTERVAL / 2)
+    assert typing_seen(watcher) == [True, False]
+
+
+async def test_leaving_without_typing_sends_nothing(presence, join, ids):
+    conv_id, alice, bob = ids
+    conn, membership = await join(alice, conv_id, bob)
+    watcher, _ = await join(bob, conv_id, alice)
+
+    await ws._disconnect(conn, membership)
+    await asyncio.sleep(INTERVAL / 2)
+    assert typing_seen(watcher) == []
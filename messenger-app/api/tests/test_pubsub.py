@@ -0,0 +1,68 @@
+"""Room fan-out through ``InMemoryBroker``; brokers on one hub act as separate workers."""
+
+import asyncio
+import uuid
+
+import pytest
+
+from app.services.pubsub import InMemoryBroker
+from app.ws import WSManager, room_channel
+
+pytestmark = pytest.mark.anyio
+
+
+def recorder(log):
+    async def handle(channel, data):
+        log.append((channel, data))
+
+    return handle
+
+
+async def test_publish_reaches_subscribers_until_they_leave():
+    hub = {}
+    a, b = InMemoryBroker(hub), InMemoryBroker(hub)
+    got_a, got_b = [], []
+    await a.start(recorder(got_a))
+    await b.start(recorder(got_b))
+
+    await a.subscribe("room")
+    await b.publish("room", "1")
+    await b.subscribe("room")
+    await b.publish("room", "2")
+    await b.publish("elsewhere", "x")
+    await a.unsubscribe("room")
+    await a.publish("room", "3")
+    await b.stop()
+    await a.publish("room", "4")
+
+    assert got_a == [("room", "1"), ("room", "2")]
+    assert got_b == [("room", "2"), ("room", "3")]
+    assert not hub.get("room")
+
+
+async def test_broadcast_reaches_sockets_on_every_worker(fake_socket):
+    hub = {}
+    workers = [WSManager(InMemoryBroker(hub)), WSManager(InMemoryBroker(hub))]
+    conv_id = uuid.uuid4()
+    conns = []
+    for worker in workers:
+        await worker.start()
+        conn = await worker.connect(uuid.uuid4(), fake_socket())
+        await worker.subscribe(conn, conv_id)
+        conns.append(conn)
+
+    await workers[0].broadcast_json(conv_id, {"type": "message:new"})
+    await asyncio.sleep(0.01)
+    await workers[1].disconnect(conns[1])
+    await workers[1].broadcast_json(conv_id, {"type": "message:edit"})
+    await asyncio.sleep(0.01)
+
+    first = {"conversation_id": str(conv_id), "type": "message:new"}
+    second = {"conversation_id": str(conv_id), "type": "message:edit"}
+    assert conns[0].ws.sent == [first, second]
+    assert conns[1].ws.sent == [first]
+    assert hub[room_channel(conv_id)] == {workers[0].broker}
+
+    await workers[0].disconnect(conns[0])
+    for worker in workers:
+        await worker.stop()
@@ -0,0 +1,164 @@
+"""One call of every ``@query_budget`` endpoint, checked against its budget."""
+
+import uuid
+
+import pytest
+
+from app.routers import attachments, auth, conversations, messages, users
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def alice(make_user):
+    return await make_user("alice")
+
+
+@pytest.fixture
+async def bob(make_user):
+    return await make_user("bob")
+
+
+@pytest.fixture
+async def conversation(client, alice, bob):
+    r = await client.post("/conversations", json={"peer_id": str(bob.id)}, headers=alice.headers)
+    assert r.status_code == 200, r.text
+    conv_id = r.json()["id"]
+    for text in ("hello there", "general kenobi", "hello again"):
+        r = await client.post(
+            f"/conversations/{conv_id}/messages", data={"content": text}, headers=bob.headers
+        )
+        assert r.status_code == 200, r.text
+    return conv_id
+
+
+async def test_register(client, budget):
+    username = f"carol_{uuid.uuid4().hex[:8]}"
+    with budget(auth.register):
+        r = await client.post(
+            "/auth/register",
+            json={"email": f"{username}@example.com", "username": username, "password": "pw"},
+        )
+    assert r.status_code == 201, r.text
+
+
+async def test_login(client, alice, budget):
+    with budget(auth.login):
+        r = await client.post("/auth/token", params={"username": alice.username, "password": "pw"})
+    assert r.status_code == 200, r.text
+
+
+async def test_get_me(client, alice, budget):
+    with budget(users.get_me):
+        r = await client.get("/users/me", headers=alice.headers)
+    assert r.status_code == 200, r.text
+
+
+async def test_search_users(client, alice, bob, budget):
+    with budget(users.search_users):
+        r = await client.get("/users/search", params={"q": bob.username}, headers=alice.headers)
+    assert r.status_code == 200, r.text
+    assert r.json()[0]["id"] == str(bob.id)
+
+
+async def test_create_or_get_conversation(client, alice, bob, conversation, budget):
+    with budget(conversations.create_or_get_conversation):
+        r = await client.post(
+            "/conversations", json={"peer_id": str(alice.id)}, headers=bob.headers
+        )
+    assert r.status_code == 200, r.text
+    assert r.json()["id"] == conversation
+
+
+async def test_list_conversations(client, alice, conversation, budget):
+    with budget(conversations.list_conversations):
+        r = await client.get("/conversations", headers=alice.headers)
+    assert r.status_code == 200, r.text
+    assert r.json()["items"][0]["unread_count"] == 3
+
+
+async def test_mark_read(client, alice, conversation, budget):
+    last = (
+        await client.get(f"/conversations/{conversation}/messages", headers=alice.headers)
+    ).json()["items"][0]
+    with budget(conversations.mark_read):
+        r = await client.post(
+            f"/conversations/{conversation}/read",
+            json={"message_id": last["id"]},
+            headers=alice.headers,
+        )
+    assert r.status_code == 200, r.text
+
+
+async def test_get_messages(client, alice, conversation, budget):
+    with budget(messages.get_messages):
+        r = await client.get(
+            f"/conversations/{conversation}/messages", params={"limit": 2}, headers=alice.headers
+        )
+    assert r.status_code == 200, r.text
+    assert len(r.json()["items"]) == 2
+
+
+async def test_sync_messages(client, alice, conversation, budget):
+    with budget(messages.sync_messages):
+        r = await client.get(f"/conversations/{conversation}/messages/sync", headers=alice.headers)
+    assert r.status_code == 200, r.text
+    assert len(r.json()["items"]) == 3
+
+
+async def test_search_messages(client, alice, conversation, budget):
+    with budget(messages.search_messages):
+        r = await client.get(
+            f"/conversations/{conversation}/messages/search",
+            params={"q": "hello"},
+            headers=alice.headers,
+        )
+    assert r.status_code == 200, r.text
+    assert len(r.json()["items"]) == 2
+
+
+async def test_create_message(client, alice, conversation, budget):
+    with budget(messages.create_message):
+        r = await client.post(
+            f"/conversations/{conversation}/messages",
+            data={"content": "hi"},
+            headers=alice.headers,
+        )
+    assert r.status_code == 200, r.text
+
+
+async def test_update_message(client, bob, conversation, budget):
+    page = await client.get(f"/conversations/{conversation}/messages", headers=bob.headers)
+    message_id = page.json()["items"][0]["id"]
+    with budget(messages.update_message):
+        r = await client.patch(
+            f"/messages/{message_id}", json={"content": "edited"}, headers=bob.headers
+        )
+    assert r.status_code == 200, r.text
+
+
+async def test_delete_message(client, bob, conversation, budget):
+    page = await client.get(f"/conversations/{conversation}/messages", headers=bob.headers)
+    message_id = page.json()["items"][0]["id"]
+    with budget(messages.delete_message):
+        r = await client.delete(f"/messages/{message_id}", headers=bob.headers)
+    assert r.status_code == 200, r.text
+
+
+async def test_download_attachment(client, alice, conversation, budget):
+    r = await client.post(
+        f"/conversations/{conversation}/messages",
+        data={"content": "file"},
+        files=[("files", ("notes.txt", b"hello", "text/plain"))],
+        headers=alice.headers,
+    )
+    assert r.status_code == 200, r.text
+    page = await client.get(f"/conversations/{conversation}/messages", headers=alice.headers)
+    attachment = page.json()["items"][0]["attachments"][0]
+    with budget(attachments.download_attachment):
+        r = await client.get(f"/attachments/{attachment['id']}", headers=alice.headers)
+    assert r.status_code == 200, r.text
+    with budget(attachments.download_attachment):
+        r = await client.get(attachment["url"])
+    assert r.status_code == 200, r.text
+    assert r.content == b"hello"
@@ -0,0 +1,75 @@
+"""The bounded outbound queue of ``app.ws.Connection``: overflow, RESYNC, coalescing."""
+
+import asyncio
+import json
+
+import pytest
+from fastapi import status
+
+from app.ws import Connection
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def connection(fake_socket):
+    def make(max_queue: int, policy: str = "drop_oldest") -> Connection:
+        # High water at the bound: only overflow is under test, not eviction.
+        return Connection(fake_socket(), max_queue=max_queue, high_water=max_queue, policy=policy)
+
+    return make
+
+
+async def delivered(conn: Connection) -> list[dict]:
+    """Run the writer until the queue is flushed and return what the client got."""
+    conn.start()
+    await asyncio.sleep(0.01)
+    await conn.stop()
+    return conn.ws.sent
+
+
+def offer(conn: Connection, n: int) -> None:
+    conn.offer(json.dumps({"n": n}))
+
+
+async def test_overflow_drops_oldest_behind_a_resync(connection):
+    conn = connection(max_queue=3)
+    for n in range(5):
+        offer(conn, n)
+    assert await delivered(conn) == [{"type": "resync"}, {"n": 3}, {"n": 4}]
+    assert conn.dropped == 3
+
+
+@pytest.mark.parametrize("max_queue", [1, 2, 3, 5])
+async def test_overflow_stays_within_max_queue_with_one_resync(connection, max_queue):
+    conn = connection(max_queue)
+    for n in range(20):
+        offer(conn, n)
+        assert len(conn._queue) <= max_queue
+    frames = await delivered(conn)
+    assert frames.count({"type": "resync"}) == 1
+    # What survives is the newest frames, in order.
+    kept = [frame["n"] for frame in frames if "n" in frame]
+    assert kept == list(range(20 - len(kept), 20))
+    assert len(kept) + conn.dropped == 20
+
+
+async def test_keyed_frames_replace_the_queued_one(connection):
+    conn = connection(max_queue=3)
+    conn.offer(json.dumps({"typing": "a"}), key="typing")
+    offer(conn, 1)
+    conn.offer(json.dumps({"typing": "b"}), key="typing")
+    offer(conn, 2)
+    assert await delivered(conn) == [{"typing": "b"}, {"n": 1}, {"n": 2}]
+    assert conn.dropped == 0
+
+
+async def test_close_policy_evicts_instead_of_dropping(connection):
+    conn = connection(max_queue=2, policy="close")
+    for n in range(3):
+        offer(conn, n)
+    assert conn.closed
+    offer(conn, 3)
+    assert await delivered(conn) == []
+    assert conn.ws.close_code == status.WS_1013_TRY_AGAIN_LATER
+    assert conn.dropped == 0
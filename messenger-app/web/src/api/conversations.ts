@@ -8,13 +8,34 @@ export interface Conversation {
   user_a: User;
   user_b: User;
   created_at: string;
+  last_message_at: string;
+  last_message: MessagePreview | null;
 }
 
-export async function listConversations(): Promise<Conversation[]> {
-  const res = await api.get<Conversation[]>("/conversations");
+export interface MessagePreview {
+  id: string;
+  sender_id: string;
+  content: string | null;
+  created_at: string;
+}
+
+export interface ConversationPage {
+  items: Conversation[];
+  next_cursor: string | null;
+}
+
+export async function listConversationsPage(cursor?: string, limit = 50): Promise<ConversationPage> {
+  const q = new URLSearchParams();
+  if (cursor) q.set("cursor", cursor);
+  q.set("limit", String(limit));
+  const res = await api.get<ConversationPage>(`/conversations?${q.toString()}`);
   return res.data;
 }
 
+export async function listConversations(): Promise<Conversation[]> {
+  return (await listConversationsPage()).items;
+}
+
 export async function createOrGetConversation(peer_id: string): Promise<Conversation> {
   const res = await api.post<Conversation>("/conversations", { peer_id });
   return res.data;
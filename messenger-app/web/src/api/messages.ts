@@ -1,12 +1,21 @@
 import api from "./client";
 import type { User } from "../types";
 
+export interface AttachmentVariant {
+  key: string;
+  width: number;
+  height: number;
+}
+
 export interface Attachment {
   id: string;
   filename: string;
   mime: string;
   size_bytes: number;
   storage_key: string;
+  // Signed download link, relative to the API root.
+  url: string;
+  variants?: Record<string, AttachmentVariant> | null;
   created_at: string;
 }
 
@@ -19,14 +28,42 @@ export interface Message {
   created_at: string;
   edited_at: string | null;
   deleted_at: string | null;
+  seq: number;
   attachments: Attachment[];
 }
 
-export async function getMessages(conversationId: string, cursor?: string, limit = 50): Promise<Message[]> {
+export interface MessagePage {
+  items: Message[];
+  next_cursor: string | null;
+}
+
+export async function getMessagesPage(
+  conversationId: string,
+  cursor?: string,
+  limit = 50
+): Promise<MessagePage> {
   const q = new URLSearchParams();
   if (cursor) q.set("cursor", cursor);
   q.set("limit", String(limit));
-  const res = await api.get<Message[]>(`/conversations/${conversationId}/messages?${q.toString()}`);
+  const res = await api.get<MessagePage>(`/conversations/${conversationId}/messages?${q.toString()}`);
+  return res.data;
+}
+
+export async function getMessages(conversationId: string, cursor?: string, limit = 50): Promise<Message[]> {
+  return (await getMessagesPage(conversationId, cursor, limit)).items;
+}
+
+export interface MessageSyncPage {
+  items: Message[];
+  last_seq: number;
+  has_more: boolean;
+}
+
+/** Messages changed (created, edited, deleted) after `afterSeq`, oldest change first. */
+export async function syncMessages(conversationId: string, afterSeq: number): Promise<MessageSyncPage> {
+  const res = await api.get<MessageSyncPage>(
+    `/conversations/${conversationId}/messages/sync?after_seq=${afterSeq}`
+  );
   return res.data;
 }
 
@@ -1,12 +1,21 @@
 import { useMemo } from "react";
+import { API_URL } from "../api/client";
 type Attachment = {
   id: string;
   filename: string;
   mime: string;
   size_bytes?: number;
   storage_key: string;
+  url: string;
+  variants?: Record<string, { key: string }> | null;
 };
 
+// Downloads are authorized; <img> and links cannot send a header, so they use
+// the short-lived signed link the API hands out with every attachment.
+function attachmentUrl(url: string, variant?: string) {
+  return `${API_URL}${url}${variant ? `&variant=${encodeURIComponent(variant)}` : ""}`;
+}
+
 function humanSize(bytes?: number) {
   if (!bytes && bytes !== 0) return "";
   const units = ["B","KB","MB","GB"];
@@ -16,12 +25,12 @@ function humanSize(bytes?: number) {
 }
 
 export default function AttachmentItem({ att }: { att: Attachment }) {
-  const url = useMemo(() => {
-    const key = att.storage_key || "";
-    if (/^https?:\/\//i.test(key)) return key;
-    if (key.startsWith("/")) return key;
-    return `/${key.replace(/^\/+/, "")}`;
-  }, [att.storage_key]);
+  const url = useMemo(() => attachmentUrl(att.url), [att.url]);
+  // Small rendition for the bubble; the links keep pointing at the original.
+  const thumbUrl = useMemo(
+    () => attachmentUrl(att.url, att.variants?.thumb ? "thumb" : undefined),
+    [att.url, att.variants]
+  );
 
   const isImage = att.mime?.startsWith("image/");
   const size = humanSize(att.size_bytes);
@@ -32,7 +41,7 @@ export default function AttachmentItem({ att }: { att: Attachment }) {
       {isImage ? (
         <a href={url} target="_blank" rel="noreferrer">
           <img
-            src={url}
+            src={thumbUrl}
             alt={att.filename}
             className="h-16 w-16 object-cover rounded-md border"
             loading="lazy"
@@ -72,7 +72,7 @@ export function MessageItem({ message, currentUsername }: Props) {
         </p>
       )}
 
-      {!!message.attachments?.length && (
+      {!message.deleted_at && !!message.attachments?.length && (
         <div className="mt-2 flex flex-col gap-2">
           {message.attachments.map((att) => (
             <AttachmentItem key={att.id} att={att} />
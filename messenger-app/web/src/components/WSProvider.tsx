@@ -0,0 +1,23 @@
+import { createContext, useEffect, useState } from "react";
+import type { ReactNode } from "react";
+import { useAuth } from "../store/auth";
+import { WSSession } from "../lib/ws";
+
+export const WSContext = createContext<WSSession | null>(null);
+
+export default function WSProvider({ children }: { children: ReactNode }) {
+  const token = useAuth((s) => s.token);
+  const [session, setSession] = useState<WSSession | null>(null);
+
+  useEffect(() => {
+    if (!token) return;
+    const s = new WSSession(token);
+    setSession(s);
+    return () => {
+      s.close();
+      setSession(null);
+    };
+  }, [token]);
+
+  return <WSContext.Provider value={session}>{children}</WSContext.Provider>;
+}
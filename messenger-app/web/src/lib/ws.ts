@@ -0,0 +1,103 @@
+type Handlers = {
+  onEvent?: (data: any) => void;
+  onReconnect?: () => void;
+};
+
+function buildWsUrl(path: string) {
+  const base = (import.meta.env.VITE_WS_URL as string) || "/ws";
+  const origin = window.location.origin.replace(/^http/, "ws");
+  return (base.startsWith("ws") ? base : origin + base) + path;
+}
+
+// One socket per signed-in session. Conversations are joined and left with
+// subscribe/unsubscribe frames as screens mount and unmount, and rejoined
+// after every reconnect.
+export class WSSession {
+  private token: string;
+  private ws: WebSocket | null = null;
+  private retry = 0;
+  private timer: ReturnType<typeof setTimeout> | null = null;
+  private stopped = false;
+  private opened = false;
+  private rooms = new Map<string, Set<Handlers>>();
+
+  constructor(token: string) {
+    this.token = token;
+    this.connect();
+  }
+
+  subscribe(conversationId: string, handlers: Handlers) {
+    const room = this.rooms.get(conversationId) ?? new Set<Handlers>();
+    if (!this.rooms.has(conversationId)) {
+      this.rooms.set(conversationId, room);
+      this.send({ type: "subscribe", conversation_id: conversationId });
+    }
+    room.add(handlers);
+    return () => {
+      room.delete(handlers);
+      if (room.size || this.rooms.get(conversationId) !== room) return;
+      this.rooms.delete(conversationId);
+      this.send({ type: "unsubscribe", conversation_id: conversationId });
+    };
+  }
+
+  send(frame: object) {
+    if (this.ws?.readyState === WebSocket.OPEN) this.ws.send(JSON.stringify(frame));
+  }
+
+  close() {
+    this.stopped = true;
+    if (this.timer) clearTimeout(this.timer);
+    this.ws?.close();
+    this.ws = null;
+  }
+
+  private connect() {
+    const ws = new WebSocket(buildWsUrl(`?token=${encodeURIComponent(this.token)}`));
+    this.ws = ws;
+
+    ws.onopen = () => {
+      this.retry = 0;
+      for (const id of this.rooms.keys()) {
+        this.send({ type: "subscribe", conversation_id: id });
+      }
+      // Events sent while we were away are lost: let every screen catch up.
+      if (this.opened) this.each(null, (h) => h.onReconnect?.());
+      this.opened = true;
+    };
+
+    ws.onmessage = (ev) => {
+      let data: any;
+      try {
+        data = JSON.parse(ev.data);
+      } catch {
+        return;
+      }
+      if (data?.type === "ping") {
+        this.send({ type: "pong" });
+        return;
+      }
+      // Frames without a conversation (resync, presence) concern every screen.
+      this.each(data?.conversation_id ?? null, (h) => h.onEvent?.(data));
+    };
+
+    ws.onclose = () => {
+      if (this.stopped || this.ws !== ws) return;
+      const delay = Math.min(30000, 1000 * Math.pow(2, this.retry++));
+      this.timer = setTimeout(() => this.connect(), delay);
+    };
+  }
+
+  private each(conversationId: string | null, fn: (h: Handlers) => void) {
+    const rooms = conversationId ? [this.rooms.get(conversationId)] : [...this.rooms.values()];
+    for (const room of rooms) {
+      room?.forEach((h) => {
+        try {
+          fn(h);
+        } catch {
+          /* ignore */
+        }
+      });
+    }
+  }
+}
@@ -9,6 +9,7 @@ import Register from "./pages/auth/Register";
 import Chats from "./pages/chats/Chats";
 import Dialog from "./pages/dialog/Dialog";
 import Profile from "./pages/profile/Profile";
+import WSProvider from "./components/WSProvider";
 import { useAuth } from "./store/auth";
 
 const qc = new QueryClient();
@@ -36,7 +37,9 @@ const router = createBrowserRouter([
 ReactDOM.createRoot(document.getElementById("root")!).render(
   <React.StrictMode>
     <QueryClientProvider client={qc}>
-      <RouterProvider router={router} />
+      <WSProvider>
+        <RouterProvider router={router} />
+      </WSProvider>
     </QueryClientProvider>
   </React.StrictMode>
 );
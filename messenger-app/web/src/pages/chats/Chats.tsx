@@ -202,7 +202,11 @@ function renderConversation(c: Conversation, userId: string | null) {
         <div className="text-sm">
           <div className="font-medium text-white">Dialog with {peerName}</div>
           <div className="text-white/60">
-            A: {c.user_a?.username ?? "—"} · B: {c.user_b?.username ?? "—"}
+            {c.last_message
+              ? `${c.last_message.sender_id === userId ? "You: " : ""}${
+                  c.last_message.content || "[attachments]"
+                } · ${new Date(c.last_message.created_at).toLocaleString()}`
+              : `A: ${c.user_a?.username ?? "—"} · B: ${c.user_b?.username ?? "—"}`}
           </div>
         </div>
       </div>
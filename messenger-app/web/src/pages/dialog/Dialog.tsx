@@ -1,9 +1,10 @@
 import { useParams } from "react-router-dom";
 import { useAuth } from "../../store/auth";
-import { useEffect, useMemo, useRef, useState } from "react";
+import { useCallback, useEffect, useMemo, useRef, useState } from "react";
 import {
   getMessages,
   sendMessage,
+  syncMessages,
   updateMessage,
   deleteMessage,
 } from "../../api/messages";
@@ -58,28 +59,79 @@ export default function Dialog() {
     queryFn: listConversations,
   });
 
-  useConversationWS(id, token, (evt) => {
-    if (evt?.type === "message:new") {
+  // Fetch only what changed since the newest change we hold, instead of
+  // reloading the whole page after a reconnect or a dropped-frame resync.
+  const catchUp = useCallback(async () => {
+    const cached = qc.getQueryData<Message[]>(["messages", id]);
+    if (!cached?.length) {
       qc.invalidateQueries({ queryKey: ["messages", id] });
+      return;
+    }
+    let after = Math.max(...cached.map((m) => m.seq ?? 0));
+    const changed = new Map<string, Message>();
+    for (;;) {
+      const page = await syncMessages(id, after);
+      page.items.forEach((m) => changed.set(m.id, m));
+      after = page.last_seq;
+      if (!page.has_more) break;
+    }
+    if (!changed.size) return;
+    qc.setQueryData(["messages", id], (old: Message[] | undefined) => {
+      const current = old || [];
+      const known = new Set(current.map((m) => m.id));
+      const added = [...changed.values()]
+        .filter((m) => !known.has(m.id))
+        .sort((a, b) => b.created_at.localeCompare(a.created_at));
+      return [...added, ...current.map((m) => changed.get(m.id) ?? m)];
+    });
+  }, [id, qc]);
+
+  useConversationWS(id, (evt) => {
+    if (evt?.type === "message:new") {
+      const incoming = evt.message as Message | undefined;
+      if (incoming) {
+        qc.setQueryData(["messages", id], (old: Message[] | undefined) =>
+          (old || []).some((m) => m.id === incoming.id)
+            ? old
+            : [incoming, ...(old || [])]
+        );
+      } else {
+        qc.invalidateQueries({ queryKey: ["messages", id] });
+      }
       queueMicrotask(() =>
         bottomRef.current?.scrollIntoView({ behavior: "smooth" })
       );
+    } else if (evt?.type === "resync") {
+      catchUp();
     } else if (evt?.type === "message:update") {
       qc.setQueryData(["messages", id], (old: Message[] | undefined) =>
         (old || []).map((m) =>
           m.id === evt.id
-            ? { ...m, content: evt.content, edited_at: evt.edited_at }
+            ? { ...m, content: evt.content, edited_at: evt.edited_at, seq: evt.seq }
+            : m
+        )
+      );
+    } else if (evt?.type === "attachment:variants") {
+      qc.setQueryData(["messages", id], (old: Message[] | undefined) =>
+        (old || []).map((m) =>
+          m.id === evt.message_id
+            ? {
+                ...m,
+                attachments: m.attachments.map((a) =>
+                  a.id === evt.attachment_id ? { ...a, variants: evt.variants } : a
+                ),
+              }
             : m
         )
       );
     } else if (evt?.type === "message:delete") {
       qc.setQueryData(["messages", id], (old: Message[] | undefined) =>
         (old || []).map((m) =>
-          m.id === evt.id ? { ...m, deleted_at: evt.deleted_at } : m
+          m.id === evt.id ? { ...m, deleted_at: evt.deleted_at, seq: evt.seq } : m
         )
       );
     }
-  });
+  }, catchUp);
 
   useEffect(() => {
     bottomRef.current?.scrollIntoView({ behavior: "instant" as ScrollBehavior });
@@ -9,6 +9,9 @@ export type Attachment = {
   id: string;
   filename: string;
   storage_key: string;
+  // Signed download link, relative to the API root.
+  url: string;
+  variants?: Record<string, { key: string; width: number; height: number }> | null;
   mime: string;
   size_bytes: number;
 };
@@ -22,5 +25,6 @@ export type Message = {
   created_at: string;
   edited_at: string | null;
   deleted_at: string | null;
+  seq: number;
   attachments: Attachment[];
 };